@@ -0,0 +1,177 @@
+import json
+import threading
+import time
+import logging
+from collections import deque
+
+import numpy as np
+import requests
+
+from spc_stats import RULE_LOOKBACK, rule_violations
+
+logger = logging.getLogger(__name__)
+
+
+class LogFileSink:
+    """Appends one JSON line per alert"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, alert):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(alert) + '\n')
+
+
+class WebhookSink:
+    """POSTs each alert as JSON, e.g. to a local relay standing in for the paging system"""
+
+    def __init__(self, url, timeout=2.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alert):
+        requests.post(self.url, json=alert, timeout=self.timeout).raise_for_status()
+
+
+class BannerSink:
+    """Keeps the most recent alerts in memory for the in-app banner"""
+
+    def __init__(self, size=20):
+        self._alerts = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def send(self, alert):
+        with self._lock:
+            self._alerts.append(alert)
+
+    def latest(self, n=3):
+        with self._lock:
+            return list(self._alerts)[-n:][::-1]
+
+
+class LeaderSink:
+    """Forwards alerts to sink only from the process holding leader (a LeaderLock).
+
+    Every worker evaluates the same rows, so sinks outside the process (log
+    file, webhook) are wrapped in this to get each alert once rather than
+    once per worker.
+    """
+
+    def __init__(self, sink, leader):
+        self.sink = sink
+        self.leader = leader
+
+    def send(self, alert):
+        if self.leader.held():
+            self.sink.send(alert)
+
+
+class AlertWorker:
+    """Background thread that runs the rule checks over newly appended batches.
+
+    notify() after a commit wakes the worker; evaluations are coalesced to at
+    most one per `debounce` seconds and only look at rows appended since the
+    previous pass (plus RULE_LOOKBACK rows of context), so the cost follows the
+    ingestion rate, not the history length. An alert for the same parameter
+    and rules is sent at most once per `cooldown` seconds; repeats inside the
+    window are counted and reported with the next alert that goes out.
+    """
+
+    def __init__(self, store, params, get_limits, sinks, rules=('ooc', 'spec'),
+                 debounce=1.0, cooldown=300.0):
+        self.store = store
+        self.params = list(params)
+        self.get_limits = get_limits
+        self.sinks = list(sinks)
+        self.rules = rules
+        self.debounce = debounce
+        self.cooldown = cooldown
+
+        self.evaluated = len(store)
+        self._last_sent = {}
+        self._suppressed = {}
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='alert-worker', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+
+    def notify(self):
+        self._wake.set()
+
+    def backlog(self):
+        """Rows committed but not yet evaluated"""
+        return len(self.store) - self.evaluated
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopped:
+                break
+            try:
+                self.evaluate()
+            except Exception as e:
+                logger.error(f"Alert evaluation failed: {e}")
+            time.sleep(self.debounce)
+
+    def evaluate(self):
+        """Check rows appended since the last pass and send any alerts"""
+        start, stop = self.evaluated, len(self.store)
+        if stop <= start:
+            return []
+
+        limits = self.get_limits(self.params)
+        context_start = max(0, start - RULE_LOOKBACK)
+        offset = start - context_start
+        batches = self.store.column('Batch', start, stop)
+
+        alerts = []
+        for param in self.params:
+            values = self.store.column(param, context_start, stop)
+            flags = rule_violations(values, limits[param])
+            hits = {rule: np.flatnonzero(flags[rule][offset:]) for rule in self.rules}
+            hits = {rule: rows for rule, rows in hits.items() if len(rows)}
+            if hits:
+                alerts.extend(self._dedupe(param, hits, batches, values[offset:], limits[param]))
+
+        self.evaluated = stop
+        for alert in alerts:
+            self._deliver(alert)
+        return alerts
+
+    def _dedupe(self, param, hits, batches, values, limits):
+        now = time.time()
+        key = (param, tuple(sorted(hits)))
+        n_points = len(np.unique(np.concatenate(list(hits.values()))))
+        if now - self._last_sent.get(key, -np.inf) < self.cooldown:
+            self._suppressed[key] = self._suppressed.get(key, 0) + n_points
+            return []
+
+        last_row = max(int(rows[-1]) for rows in hits.values())
+        self._last_sent[key] = now
+        return [{
+            'param': param,
+            'rules': sorted(hits),
+            'batch': int(batches[last_row]),
+            'value': float(values[last_row]),
+            'ucl': float(limits['ucl']),
+            'lcl': float(limits['lcl']),
+            'points': n_points + self._suppressed.pop(key, 0),
+            'time': now
+        }]
+
+    def _deliver(self, alert):
+        for sink in self.sinks:
+            try:
+                sink.send(alert)
+            except Exception as e:
+                logger.error(f"Alert sink {type(sink).__name__} failed: {e}")
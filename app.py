@@ -1,12 +1,35 @@
-from dash import Dash, dcc, html, dash_table, Input, Output, State, callback_context, no_update
+from dash import Dash, dcc, html, dash_table, Input, Output, State, ALL, MATCH, Patch, ClientsideFunction, callback_context, no_update
 import dash_daq as daq
 import pandas as pd
-import copy
+import numpy as np
 from textwrap import dedent
 import plotly.graph_objects as go
 from openai import AzureOpenAI
 import os
+import json
 import logging
+import zipfile
+import atexit
+import threading
+import time
+from limits_repo import LimitsRepository, LIMIT_KEYS
+from log_queue import configure_logging, parse_sample_rates
+from column_store import ColumnStore, compact_dtypes, to_epoch_seconds
+from derived import DerivedMetrics
+from shared_history import LeaderLock, SharedHistoryFile, file_mark, mark_holds
+from snapshot import (Snapshot, pack_archive, pack_correlation, pack_histogram, pack_stats, pack_store,
+                      pack_t2_chart, unpack_archive, unpack_correlation, unpack_histogram, unpack_stats,
+                      unpack_store, unpack_t2_chart)
+from diagnostics import create_diagnostics_blueprint
+from archive import HistoryArchive
+from plant import PlantMonitor
+from ingest import IngestError, create_ingest_blueprint
+from export import create_export_blueprint
+from alerts import AlertWorker, BannerSink, LeaderSink, LogFileSink, WebhookSink
+from push import PushChannel, PushSink, create_push_blueprint
+from sparklines import sparkline_figure, sparkline_svg_uri
+from spc_stats import (FixedHistogram, HotellingT2Chart, LaggedCorrelation, RunningStats, downsample_minmax,
+                       historical_limits, limit_grid_rates, limit_overrides, ooc_mask, ooc_summary)
 
 app = Dash(
     __name__,
@@ -14,10 +37,181 @@ app = Dash(
 )
 server = app.server
 
-df = pd.read_csv("data/spc_data.csv")
+# Structured JSON logs written off the request path. SPC_LOG_SAMPLE keeps a
+# fraction of each logger's debug/info records, e.g. "werkzeug=0.01,app=0.5"
+configure_logging(
+    level=os.getenv('SPC_LOG_LEVEL', 'INFO'),
+    sample_rates=parse_sample_rates(os.getenv('SPC_LOG_SAMPLE', '')),
+    max_field_chars=int(os.getenv('SPC_LOG_FIELD_CHARS', '512'))
+)
+logger = logging.getLogger(__name__)
 
-params = list(df)
-max_length = len(df)
+# Optional timestamp column of the history, e.g. SPC_TIME_COLUMN=Timestamp. It
+# is held as epoch seconds next to Batch and is not a monitored parameter
+TIME_COLUMN = os.getenv('SPC_TIME_COLUMN')
+time_columns = [TIME_COLUMN] if TIME_COLUMN else []
+
+HISTORY_PATH = os.getenv('SPC_HISTORY_PATH', "data/spc_data.csv")
+FULL_PATH = os.getenv('SPC_FULL_PATH', "data/spc_data_full.csv")
+history_header = list(pd.read_csv(HISTORY_PATH, nrows=0))
+full_header = list(pd.read_csv(FULL_PATH, nrows=0))
+
+# Columns of the wide dataset that are the same measurements as a history column
+FULL_COLUMN_ALIASES = {
+    'Para1Tgt': 'Diameter',
+    'Para1': 'Etch1',
+    'Para4': 'Film-Thickness',
+    'Para5': 'Overlay',
+    'Para7': 'Etch2',
+    'Para9': 'Line-Width',
+    'Para14': 'Volume'
+}
+
+# 'memory' reads the whole history; 'chunked' streams it and keeps only the last
+# SPC_HISTORY_TAIL rows as arrays, earlier rows are summarised in the archive
+HISTORY_MODE = os.getenv('SPC_HISTORY_MODE', 'memory')
+HISTORY_TAIL = int(os.getenv('SPC_HISTORY_TAIL', '10000'))
+CHUNK_ROWS = int(os.getenv('SPC_CHUNK_ROWS', '100000'))
+
+# Derived parameters, e.g. deviations from target like "Para2 - Para2Tgt",
+# declared in the JSON file SPC_DERIVED_METRICS names (none while it is unset,
+# see data/derived_metrics.example.json). Wide-dataset columns they read are
+# taken from the history column they alias where there is one, otherwise
+# joined from the wide dataset on Batch, and ingested batches must then carry
+# them; the derived columns are stored and monitored like any measured parameter
+DERIVED_CONFIG = os.getenv('SPC_DERIVED_METRICS')
+derived_metrics = DerivedMetrics.load(DERIVED_CONFIG) if DERIVED_CONFIG else None
+derived_aliases = {}
+derived_sources = []
+derived_source = None
+if derived_metrics is not None and HISTORY_MODE == 'chunked':
+    logger.warning("Derived metrics are not available in chunked history mode",
+                   extra={'fields': {'metrics': derived_metrics.names}})
+    derived_metrics = None
+if derived_metrics is not None:
+    clashes = [name for name in derived_metrics.names if name in history_header]
+    if clashes:
+        raise ValueError(f"Derived metrics {clashes} clash with history columns")
+    derived_inputs = [col for col in derived_metrics.required_columns() if col not in history_header]
+    derived_aliases = {col: FULL_COLUMN_ALIASES[col] for col in derived_inputs if col in FULL_COLUMN_ALIASES}
+    derived_sources = [col for col in derived_inputs if col not in derived_aliases]
+    unknown = [col for col in derived_sources if col not in full_header]
+    if unknown:
+        raise ValueError(f"Derived metrics read {unknown}, found in neither the history nor {FULL_PATH}")
+    if derived_sources:
+        # Joined columns by batch, extended as rows appended to the wide dataset are followed
+        derived_source = ColumnStore.from_frame(pd.read_csv(FULL_PATH, usecols=['Batch', *derived_sources]),
+                                                index_columns=['Batch'])
+
+
+def prepare_history(frame):
+    """Rows read from the history file as the store holds them: timestamps as epoch seconds, derived columns added"""
+    for col in time_columns:
+        frame[col] = to_epoch_seconds(frame[col])
+    if derived_metrics is None:
+        return frame
+    inputs = {col: frame[col].to_numpy() for col in derived_metrics.required_columns() if col in frame}
+    inputs.update((col, frame[alias].to_numpy()) for col, alias in derived_aliases.items())
+    if derived_source is not None:
+        rows = np.array([derived_source.find('Batch', batch) for batch in frame['Batch']], dtype=float)
+        found = ~np.isnan(rows)
+        for col in derived_sources:
+            values = np.full(len(frame), np.nan)
+            values[found] = derived_source.column(col)[rows[found].astype(np.int64)]
+            inputs[col] = values
+    for name, values in derived_metrics.compute(inputs).items():
+        frame[name] = values
+    return frame
+
+
+# SPC_STATE_SNAPSHOT=data/spc_state.npz keeps the computed state (history
+# arrays, archive, limits, accumulators, OOC counts, correlation and T2 chart)
+# in one binary file. A restart with the same settings loads it and replays
+# only the rows appended to the history file since (ingested batches among
+# them), instead of rebuilding everything from the CSV files
+SNAPSHOT_PATH = os.getenv('SPC_STATE_SNAPSHOT')
+COMPACT_DTYPES = os.getenv('SPC_COMPACT_DTYPES') == '1'
+snapshot_settings = json.loads(json.dumps({
+    'history': HISTORY_PATH,
+    'mode': HISTORY_MODE,
+    'tail_rows': HISTORY_TAIL if HISTORY_MODE == 'chunked' else None,
+    'compact_dtypes': COMPACT_DTYPES,
+    'time_columns': time_columns,
+    'derived': derived_metrics and derived_metrics.expressions
+}))
+
+
+def load_warm_snapshot():
+    """The state snapshot if there is a usable one, else None to cold start"""
+    if not SNAPSHOT_PATH:
+        return None
+    try:
+        snapshot = Snapshot.load(SNAPSHOT_PATH)
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        logger.warning("Unreadable state snapshot, rebuilding", extra={'fields': {'path': SNAPSHOT_PATH, 'error': str(e)}})
+        return None
+    if snapshot is None or snapshot.meta['settings'] != snapshot_settings:
+        logger.info("No state snapshot for these settings, rebuilding", extra={'fields': {'path': SNAPSHOT_PATH}})
+        return None
+    if not mark_holds(snapshot.meta['source']):
+        logger.info("History file rewritten since the state snapshot, rebuilding",
+                    extra={'fields': {'path': SNAPSHOT_PATH}})
+        return None
+    return snapshot
+
+
+snapshot = load_warm_snapshot()
+if snapshot is not None:
+    archive = unpack_archive(snapshot, snapshot.meta['archive'])
+    history = unpack_store(snapshot, snapshot.meta['history'])
+    history_mark = snapshot.meta['source']
+    logger.info("Restored state snapshot", extra={'fields': {'path': SNAPSHOT_PATH, 'rows': len(history)}})
+else:
+    if HISTORY_MODE == 'chunked':
+        archive, df = HistoryArchive.load(HISTORY_PATH, tail_rows=HISTORY_TAIL, chunk_rows=CHUNK_ROWS,
+                                          exclude=time_columns)
+    else:
+        df = pd.read_csv(HISTORY_PATH)
+        archive = None
+    history_mark = file_mark(HISTORY_PATH)
+    df = prepare_history(df)
+    if derived_metrics is not None:
+        logger.info("Derived metrics added", extra={'fields': {'metrics': derived_metrics.expressions,
+                                                               'aliases': derived_aliases,
+                                                               'source_columns': derived_sources}})
+    if archive is None:
+        archive = HistoryArchive([col for col in df if col not in time_columns][1:])
+
+    # Batch history that ingested rows are appended to. SPC_COMPACT_DTYPES=1 stores
+    # each column as int32/float32 where its measured resolution allows; either way
+    # df becomes a view of the store, so there is one array per column in memory.
+    # Batch and the timestamp are indexed for range queries and point lookups
+    history = ColumnStore.from_frame(df, compact_dtypes(df) if COMPACT_DTYPES else None,
+                                     index_columns=['Batch', *time_columns])
+
+params = [col for col in history.columns if col not in time_columns]
+max_length = len(history)
+df = history.frame()  # df stays the startup snapshot
+
+# Ingested batches are appended to the history file, and every worker follows
+# the file, so all of them (and the next start) hold the same rows. Rows are
+# folded in by position in the file, past history_file.mark
+history_file = SharedHistoryFile(HISTORY_PATH, history_header, history_mark)
+FOLLOW_INTERVAL = float(os.getenv('SPC_FOLLOW_INTERVAL', '1.0'))
+
+# Wide dataset for multivariate monitoring: every column except Batch. Ingested
+# batches are appended to it as well and followed like the history file, each
+# new row scored and folded into the T2 chart. The chart comes from the state
+# snapshot while the file still starts with the rows it covers
+multivariate_params = [col for col in full_header if col != 'Batch']
+if snapshot is not None and mark_holds(snapshot.meta['t2']['mark']):
+    df_full = None
+    t2_chart = unpack_t2_chart(snapshot, snapshot.meta['t2'])
+    full_file = SharedHistoryFile(FULL_PATH, full_header, snapshot.meta['t2']['mark'])
+else:
+    df_full = pd.read_csv(FULL_PATH)
+    t2_chart = None
+    full_file = SharedHistoryFile(FULL_PATH, full_header, file_mark(FULL_PATH))
 
 suffix_row = '_row'
 suffix_button_id = '_button'
@@ -27,6 +221,35 @@ suffix_ooc_n = '_OOC_number'
 suffix_ooc_g = '_OOC_graph'
 suffix_indicator = '_indicator'
 
+# Rows of the metric summary list shown per page; only the mounted rows are built and updated
+METRIC_PAGE_SIZE = int(os.getenv('SPC_METRIC_PAGE_SIZE', '20'))
+
+
+def metric_id(param, suffix):
+    """Pattern-matching id of a metric row component; param is MATCH or ALL in callbacks"""
+    return {'type': 'metric' + suffix, 'index': param}
+
+
+# 'graph' draws one dcc.Graph per metric row with every point; 'svg' draws a
+# downsampled polyline image per row, so no plotly instance is created for it
+SPARKLINE_MODE = os.getenv('SPC_SPARKLINE_MODE', 'graph')
+sparkline_prop = 'src' if SPARKLINE_MODE == 'svg' else 'extendData'
+
+# Plant-wide view over a directory holding one history file per production line
+PLANT_DIR = os.getenv('SPC_PLANT_DIR')
+plant_monitor = PlantMonitor(PLANT_DIR) if PLANT_DIR else None
+
+# Limits edited on the Specification Settings tab, shared by all sessions and workers
+limits_repo = LimitsRepository(os.getenv('SPC_LIMITS_DB', 'data/spc_limits.db'))
+atexit.register(limits_repo.close)
+
+ALERT_BANNER_STYLE = {
+    'display': 'block',
+    'backgroundColor': '#2d3038',
+    'color': '#FFD15F',
+    'padding': '5px 20px'
+}
+
 theme = {
     'dark': True,
     'detail': '#2d3038',  # Background-card
@@ -34,15 +257,15 @@ theme = {
     'secondary': '#FFD15F',  # Accent
 }
 
-# Add logging configuration
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
 # Configuration constants
 AZURE_OPENAI_ENDPOINT = os.getenv('AZURE_OPENAI_ENDPOINT')
 AZURE_OPENAI_DEPLOYMENT = os.getenv('AZURE_OPENAI_DEPLOYMENT')
 AZURE_OPENAI_API_VERSION = os.getenv('AZURE_OPENAI_API_VERSION', '2024-05-01-preview')
 
+column_bytes = history.nbytes()
+logger.info(f"History columns hold {sum(column_bytes.values())} bytes "
+            f"({'compact' if COMPACT_DTYPES else 'default'} dtypes): {column_bytes}")
+
 logger.info(f"OpenAI Configuration:")
 logger.info(f"Endpoint: {AZURE_OPENAI_ENDPOINT}")
 logger.info(f"Deployment: {AZURE_OPENAI_DEPLOYMENT}")
@@ -70,7 +293,7 @@ def get_ai_response(question):
     if client is None:
         return "AI assistant is currently unavailable. Please check your Azure OpenAI configuration."
         
-    logger.info(f"Sending question to Azure OpenAI: {question}")
+    logger.info("Sending question to Azure OpenAI", extra={'fields': {'question': question}})
     try:
         response = client.chat.completions.create(
             model=AZURE_OPENAI_DEPLOYMENT,
@@ -81,9 +304,10 @@ def get_ai_response(question):
             max_tokens=150,
             temperature=0.7
         )
-        logger.info("Received response from Azure OpenAI")
-        logger.info(f"Response content: {response.choices[0].message.content}")
-        return response.choices[0].message.content
+        content = response.choices[0].message.content
+        logger.info("Received response from Azure OpenAI", extra={'fields': {'chars': len(content or '')}})
+        logger.debug("Azure OpenAI response", extra={'fields': {'content': content}})
+        return content
     except Exception as e:
         logger.error(f"Error getting AI response: {str(e)}")
         logger.error(f"Full error details: {repr(e)}")
@@ -106,6 +330,20 @@ def build_banner():
     )
 
 
+def build_alert_banner():
+    alerts = alert_banner.latest()
+    return html.Div(
+        id='alert-banner',
+        style=ALERT_BANNER_STYLE if alerts else {'display': 'none'},
+        children=[html.Div(format_alert(alert)) for alert in alerts]
+    )
+
+
+def format_alert(alert):
+    return (f"{alert['param']}: {', '.join(alert['rules']).upper()} at batch {alert['batch']} "
+            f"(value {alert['value']:.4g}, {alert['points']} point(s))")
+
+
 def build_tabs():
     return html.Div(
         id='tabs',
@@ -149,93 +387,415 @@ def build_tabs():
                             'justifyContent': 'center'
                         },
                         disabled=False)
-                ]
+                ] + ([
+                    dcc.Tab(
+                        id='Plant-tab',
+                        label='Plant Summary',
+                        value='tab3',
+                        className='custom-tab',
+                        selected_className='custom-tab--selected'
+                    )
+                ] if plant_monitor else [])
             )
         ]
     )
 
 
+def init_t2_chart():
+    chart = HotellingT2Chart(multivariate_params)
+    chart.fit(df_full['Batch'].to_numpy(), df_full[multivariate_params].to_numpy(dtype=float))
+    return chart
+
+
+if t2_chart is None:
+    t2_chart = init_t2_chart()
+
+
+def init_correlation():
+    corr = LaggedCorrelation(params[1:])
+    corr.update(df[params[1:]].to_numpy(dtype=float))
+    return corr
+
+
+correlation_state = (unpack_correlation(snapshot, snapshot.meta['correlation']) if snapshot is not None
+                     else init_correlation())
+
+
+def history_stats(param):
+    """RunningStats over the archived rows and the in-memory history of a parameter"""
+    stats = RunningStats()
+    stats.merge(archive.stats[param])
+    stats.update(history.column(param))
+    return stats
+
+
+def history_ooc(param, ucl, lcl):
+    """OOC count and rate over the archived rows and the in-memory history"""
+    count = archive.ooc_counts({param: (ucl, lcl)})[param]
+    count += ooc_summary(history.column(param), ucl, lcl)[0]
+    total = archive.n_rows + len(history)
+    return count, count / total if total else 0.0
+
+
+def compute_default_limits():
+    """Historical limits per parameter, computed once from the dataset"""
+    limits = {}
+    first_row = df.iloc[0] if len(df) else {}
+    for param in params[1:]:  # Skip 'Batch'
+        stats = history_stats(param)
+
+        # Get the actual control limits from your dataset
+        # Assuming your dataset has these columns: param_UCL, param_LCL, param_USL, param_LSL
+        limits[param] = historical_limits(stats.mean, stats.std, limit_overrides(first_row, param))
+        
+        logger.debug("Initialized default limits", extra={'fields': {'param': param, **limits[param]}})
+
+    return limits
+
+
+default_limits = snapshot.meta['default_limits'] if snapshot is not None else compute_default_limits()
+
+
+def current_limits(param, stored_limits=None):
+    """Historical limits overlaid with the latest ones saved from the Specification Settings tab"""
+    if stored_limits is None:
+        stored_limits = limits_repo.get_all()
+    limits = dict(default_limits[param])
+    saved = stored_limits.get(param, {})
+    limits.update({key: saved[key] for key in LIMIT_KEYS if saved.get(key) is not None})
+    return limits
+
+
+HISTOGRAM_SIGMAS = 6
+
+
 def init_df():
+    """Server-side SPC state per parameter, updated in place as batches are ingested"""
     ret = {}
-    for col in list(df[1:]):
-        data = df[col]
-        stats = data.describe()
-
-        std = stats['std'].tolist()
-        ucl = (stats['mean'] + 3 * stats['std']).tolist()
-        lcl = (stats['mean'] - 3 * stats['std']).tolist()
-        usl = (stats['mean'] + stats['std']).tolist()
-        lsl = (stats['mean'] - stats['std']).tolist()
-
-        ret.update({
-            col: {
-                'count': stats['count'].tolist(),
-                'data': data,
-                'mean': stats['mean'].tolist(),
-                'std': std,
-                'ucl': round(ucl, 3),
-                'lcl': round(lcl, 3),
-                'usl': round(usl, 3),
-                'lsl': round(lsl, 3),
-                'min': stats['min'].tolist(),
-                'max': stats['max'].tolist(),
-                'ooc': populate_ooc(data, ucl, lcl)
-            }
-        })
+    stored_limits = limits_repo.get_all()
+    all_limits = {col: current_limits(col, stored_limits) for col in params[1:]}
+    # One rescan of the archived rows counts every parameter
+    archived_ooc = archive.ooc_counts({col: (limits['ucl'], limits['lcl']) for col, limits in all_limits.items()})
+    for col in params[1:]:
+        data = history.column(col)
+        limits = all_limits[col]
+        stats = history_stats(col)
+        # Bin edges are fixed once, wide enough that limit changes only re-bin the counts
+        hist = FixedHistogram(stats.mean - HISTOGRAM_SIGMAS * stats.std, stats.mean + HISTOGRAM_SIGMAS * stats.std)
+        hist.update(data)
+
+        ret[col] = {
+            'stats': stats,
+            'hist': hist,
+            'ucl': limits['ucl'],
+            'lcl': limits['lcl'],
+            'usl': limits['usl'],
+            'lsl': limits['lsl'],
+            'ooc_count': archived_ooc[col] + ooc_summary(data, limits['ucl'], limits['lcl'])[0]
+        }
+        summarize_state(ret[col], archive.n_rows + len(data))
 
+    archive.fill_histograms({col: entry['hist'] for col, entry in ret.items()})
     return ret
 
 
-def populate_ooc(data, ucl, lcl):
-    ooc_count = 0
-    ret = []
-    for i in range(len(data)):
-        if data[i] >= ucl or data[i] <= lcl:
-            ooc_count += 1
-            ret.append(ooc_count / (i + 1))
-        else:
-            ret.append(ooc_count / (i + 1))
+def pack_state(snap):
+    return {
+        param: {
+            'stats': pack_stats(entry['stats']),
+            'hist': pack_histogram(snap, entry['hist']),
+            **{key: entry[key] for key in LIMIT_KEYS},
+            'ooc_count': int(entry['ooc_count'])
+        }
+        for param, entry in state_dict.items()
+    }
+
+
+def unpack_state(snap, packed, count):
+    """SPC state as it was snapshotted, over count rows"""
+    ret = {}
+    for param, saved in packed.items():
+        ret[param] = {
+            'stats': unpack_stats(saved['stats']),
+            'hist': unpack_histogram(snap, saved['hist']),
+            **{key: saved[key] for key in LIMIT_KEYS},
+            'ooc_count': saved['ooc_count']
+        }
+        summarize_state(ret[param], count)
     return ret
 
 
-state_dict = init_df()
+def save_state_snapshot(path):
+    """Write the SPC state over the rows read from the history file so far, for the next start to restore"""
+    snap = Snapshot()
+    with history.lock:
+        snap.meta.update({
+            'settings': snapshot_settings,
+            'source': history_file.mark,
+            'source_columns': history_header,
+            'history': pack_store(snap, history),
+            'archive': pack_archive(snap, archive),
+            'default_limits': default_limits,
+            'state': pack_state(snap),
+            'correlation': pack_correlation(snap, correlation_state),
+            't2': {**pack_t2_chart(snap, t2_chart), 'mark': full_file.mark}
+        })
+    snap.save(path)
+    logger.info("Saved state snapshot", extra={'fields': {'path': path, 'rows': len(history),
+                                                          'bytes': os.path.getsize(path)}})
+
+
+def summarize_state(entry, count):
+    stats = entry['stats']
+    entry.update({
+        'count': count,
+        'mean': stats.mean,
+        'std': stats.std,
+        'min': stats.min,
+        'max': stats.max,
+        'ooc_rate': entry['ooc_count'] / count if count else 0.0
+    })
+
+
+def sync_state_limits():
+    """Pick up limits saved by any session or worker, recounting OOC only where they changed; True if any did"""
+    stored_limits = limits_repo.get_all()
+    with history.lock:
+        changed = False
+        for param, entry in state_dict.items():
+            limits = current_limits(param, stored_limits)
+            if all(entry[key] == limits[key] for key in LIMIT_KEYS):
+                continue
+            entry.update({key: limits[key] for key in LIMIT_KEYS})
+            entry['ooc_count'] = history_ooc(param, entry['ucl'], entry['lcl'])[0]
+            summarize_state(entry, archive.n_rows + len(history))
+            changed = True
+        if changed:
+            metric_order['ooc'] = rank_by_ooc()
+    return changed
+
+
+def update_spc_state(start, stop):
+    """Fold rows [start, stop) of the history into the SPC state; cost is proportional to the new rows"""
+    for param, entry in state_dict.items():
+        new_values = history.column(param, start, stop)
+        entry['stats'].update(new_values)
+        entry['hist'].update(new_values)
+        entry['ooc_count'] += int(np.count_nonzero(ooc_mask(new_values, entry['ucl'], entry['lcl'])))
+        summarize_state(entry, archive.n_rows + stop)
+    metric_order['ooc'] = rank_by_ooc()
+    correlation_state.update(history.frame(start, stop, params[1:]).to_numpy(dtype=float))
+
+
+def rank_by_ooc():
+    """Parameters ordered worst OOC% first, ties in dataset order"""
+    rates = np.array([state_dict[param]['ooc_rate'] for param in params[1:]])
+    return [params[1 + i] for i in np.argsort(-rates, kind='stable')]
+
+
+def fold_appended_rows():
+    """Fold rows appended to the history file since the last look into the store and the SPC state,
+    and rows appended to the wide dataset into the T2 chart.
+
+    Returns the (start, stop) range of the store rows added.
+    """
+    with history.lock:
+        # A batch's wide row is written before its history row, so reading the history file
+        # first and the wide file second finds the wide row of every history row read
+        frame = history_file.follow()
+        wide = full_file.follow()
+        if len(wide):
+            t2_chart.append(wide['Batch'].to_numpy(), wide[multivariate_params].to_numpy(dtype=float))
+            if derived_source is not None:
+                derived_source.append({col: wide[col].to_numpy() for col in derived_source.columns})
+        if not len(frame):
+            return len(history), len(history)
+        frame = prepare_history(frame)
+        start, stop = history.append({col: frame[col].to_numpy() for col in history.columns})
+        update_spc_state(start, stop)
+        return start, stop
+
+
+def follow_history_file():
+    """Pick up batches ingested by the other workers, or appended by anything else"""
+    while True:
+        time.sleep(FOLLOW_INTERVAL)
+        try:
+            start, stop = fold_appended_rows()
+        except ValueError as e:
+            logger.error(f"Stopped following the history file: {e}")
+            return
+        if stop > start:
+            alert_worker.notify()
+            push_channel.notify(start, stop)
+
+
+def check_new_batches(batches):
+    """Refuse batch ids given twice or already held, archived ones included"""
+    batches = batches.astype(history.column('Batch').dtype)
+    unique, counts = np.unique(batches, return_counts=True)
+    held = history.contains('Batch', batches)
+    if archive.x_max is not None:
+        # Archived batch ids are not indexed; anything not after them is treated as held
+        held |= batches <= archive.x_max
+    if held.any() or (counts > 1).any():
+        raise IngestError(f"Batch ids already in the history: {np.unique(batches[held])[:20].tolist()}, "
+                          f"repeated in the request: {unique[counts > 1][:20].tolist()}", status=409)
+
+
+def history_file_rows(columns):
+    """Ingested arrays as rows of the history file: integer columns as integers, timestamps as ISO 8601"""
+    frame = pd.DataFrame({col: columns[col] for col in history_header})
+    for col in history_header:
+        if col in time_columns:
+            frame[col] = pd.to_datetime(frame[col], unit='s', utc=True).map(lambda stamp: stamp.isoformat())
+        elif history.column(col).dtype.kind in 'iu':
+            frame[col] = frame[col].astype(np.int64)
+    return frame
+
+
+def full_file_rows(columns):
+    """Ingested arrays as rows of the wide dataset, its columns taken as sent or from their history alias"""
+    n_rows = len(columns['Batch'])
+    frame = pd.DataFrame({'Batch': columns['Batch'].astype(history.column('Batch').dtype)})
+    for col in multivariate_params:
+        source = col if col in columns else FULL_COLUMN_ALIASES.get(col)
+        frame[col] = columns[source] if source in columns else np.full(n_rows, np.nan)
+    return frame
+
+
+def ingest_batches(columns):
+    """Append ingested rows to the history file and fold them into the SPC state as one commit"""
+    with history.lock, history_file.lock():
+        start = len(history)
+        # Catch up with rows other workers wrote, so the duplicate check sees them
+        fold_appended_rows()
+        check_new_batches(columns['Batch'])
+        full_file.append(full_file_rows(columns))
+        history_file.append(history_file_rows(columns))
+        _, stop = fold_appended_rows()
+    alert_worker.notify()
+    push_channel.notify(start, stop)
+    n_rows = len(columns['Batch'])
+    logger.info("Ingested batches", extra={'fields': {'rows': n_rows, 'total': stop}})
+    return {'rows': n_rows, 'total': stop}
+
+
+def rule_limits(selected):
+    """Current limits plus the historical centre line, as the run rules need"""
+    sync_state_limits()
+    return {
+        param: {**{key: state_dict[param][key] for key in LIMIT_KEYS}, 'mean': default_limits[param]['mean']}
+        for param in selected
+    }
+
+
+def build_push_deltas(start, stop, max_points=50):
+    """Per-parameter update for browsers after rows [start, stop) arrived, capped to the last max_points"""
+    start = max(start, stop - max_points)
+    batches = history.tolist('Batch', start, stop)
+    deltas = {}
+    for param in params[1:]:
+        entry = state_dict[param]
+        ooc_pct = entry['ooc_rate'] * 100
+        deltas[param] = {
+            'param': param,
+            'count': entry['count'],
+            'ooc_pct': ooc_pct,
+            'color': theme['primary'] if ooc_pct + 0.00001 < 6 else theme['secondary'],
+            'x': batches,
+            'y': [None if np.isnan(v) else v for v in history.tolist(param, start, stop)]
+        }
+        if SPARKLINE_MODE == 'svg':
+            deltas[param]['sparkline'] = sparkline_svg_uri(history.column(param))
+    return deltas
+
+
+def poll_push_deltas(since):
+    """(row cursor, deltas for rows after since) for browsers polling in place of the stream"""
+    stop = len(history)
+    if since is None or since >= stop:
+        return max(since or 0, stop), []
+    return stop, list(build_push_deltas(max(since, 0), stop).values())
+
+
+state_dict = (unpack_state(snapshot, snapshot.meta['state'], archive.n_rows + len(history)) if snapshot is not None
+              else init_df())
+
+# Orderings the metric summary list pages through, kept current as the state changes
+metric_order = {'params': params[1:]}
+metric_order['ooc'] = rank_by_ooc()
+
+if SNAPSHOT_PATH:
+    stale = snapshot is None or df_full is not None
+    if snapshot is not None:
+        # Rows appended to the history file since the snapshot are folded in and move the
+        # historical limits as on a cold start; OOC is then recounted where any limits changed
+        t2_mark = full_file.mark
+        replayed_from, replayed_to = fold_appended_rows()
+        if replayed_to > replayed_from:
+            logger.info("Replayed history rows", extra={'fields': {'rows': replayed_to - replayed_from}})
+            default_limits = compute_default_limits()
+            stale = True
+        stale = full_file.mark != t2_mark or stale
+        stale = sync_state_limits() or stale
+    if stale:
+        save_state_snapshot(SNAPSHOT_PATH)
+
+# One producer builds each update once and fans it out to all connected browsers.
+# Every worker folds every batch (see follow_history_file), so browsers get
+# updates whichever worker they are connected to. An open stream holds one of
+# the worker's threads (--threads in the Procfile), so SPC_MAX_STREAMS caps
+# streams per worker; the default leaves half of the Procfile's 32 threads
+# for callbacks; browsers turned away poll for the same deltas until a stream
+# is free (assets/spc_push.js)
+MAX_STREAMS = int(os.getenv('SPC_MAX_STREAMS', '16'))
+push_channel = PushChannel(build_push_deltas).start()
+server.register_blueprint(create_push_blueprint(push_channel, params[1:], max_streams=MAX_STREAMS,
+                                                poll=poll_push_deltas))
+
+# Alerts are evaluated off the request path as batches arrive
+MAX_ALERT_BACKLOG = 500000
+alert_banner = BannerSink()
+# Every worker evaluates every row; the log file and the webhook hear from one of them
+ALERT_LOG = os.getenv('SPC_ALERT_LOG', 'data/spc_alerts.log')
+alert_leader = LeaderLock(f'{ALERT_LOG}.leader')
+alert_sinks = [alert_banner, PushSink(push_channel), LeaderSink(LogFileSink(ALERT_LOG), alert_leader)]
+if os.getenv('SPC_ALERT_WEBHOOK'):
+    alert_sinks.append(LeaderSink(WebhookSink(os.getenv('SPC_ALERT_WEBHOOK')), alert_leader))
+alert_worker = AlertWorker(history, params[1:], rule_limits, alert_sinks).start()
+threading.Thread(target=follow_history_file, name='history-follower', daemon=True).start()
+
+ingest_columns = [col for col in history.columns if col not in (derived_metrics.names if derived_metrics else ())]
+ingest_columns += derived_sources
+server.register_blueprint(create_ingest_blueprint(
+    ingest_columns,
+    ingest_batches,
+    is_backlogged=lambda: alert_worker.backlog() > MAX_ALERT_BACKLOG,
+    max_bytes=int(os.getenv('SPC_INGEST_MAX_BYTES', str(64 * 1024 * 1024))),
+    time_columns=time_columns,
+    # Wide-dataset columns without a history alias, for the T2 chart; unsent ones are left empty
+    optional_columns=[col for col in multivariate_params if col not in FULL_COLUMN_ALIASES and col not in ingest_columns],
+    # Stored as integers, so an empty or fractional value would be cast rather than kept
+    integer_columns=[col for col in history_header if history.column(col).dtype.kind in 'iu']
+))
+server.register_blueprint(create_export_blueprint(history, params[1:], rule_limits, TIME_COLUMN))
 
 
 def init_value_setter_store():
     """Initialize store data with values from dataset"""
     initial_data = {}
+    # The server-side state already counts OOC for the current limits, so no pass over the history is needed
+    sync_state_limits()
+    stored_limits = limits_repo.get_all()
     for param in params[1:]:  # Skip 'Batch'
-        data = df[param]
-        stats = data.describe()
-        
-        # Calculate control limits based on statistics
-        mean = stats['mean']
-        std = stats['std']
-        
-        # Get the actual control limits from your dataset
-        # Assuming your dataset has these columns: param_UCL, param_LCL, param_USL, param_LSL
-        param_ucl = df[f'{param}_UCL'].iloc[0] if f'{param}_UCL' in df else round(mean + 2 * std, 3)
-        param_lcl = df[f'{param}_LCL'].iloc[0] if f'{param}_LCL' in df else round(mean - 2 * std, 3)
-        param_usl = df[f'{param}_USL'].iloc[0] if f'{param}_USL' in df else round(mean + 3 * std, 3)
-        param_lsl = df[f'{param}_LSL'].iloc[0] if f'{param}_LSL' in df else round(mean - 3 * std, 3)
-        
+        entry = state_dict[param]
         initial_data[param] = {
-            'data': data.tolist(),
-            'usl': param_usl,
-            'lsl': param_lsl,
-            'ucl': param_ucl,
-            'lcl': param_lcl,
-            'mean': round(mean, 3),
-            'std': round(std, 3),
-            'ooc': populate_ooc(data, param_ucl, param_lcl)
+            **current_limits(param, stored_limits),
+            'ooc_count': entry['ooc_count'],
+            'ooc_rate': entry['ooc_rate']
         }
         
-        print(f"Debug - Initialized {param} with values:")
-        print(f"  UCL: {param_ucl}")
-        print(f"  LCL: {param_lcl}")
-        print(f"  USL: {param_usl}")
-        print(f"  LSL: {param_lsl}")
-        
     return initial_data
 
 
@@ -298,9 +858,170 @@ def build_tab_1():
                 html.Button('View current setup', id='value-setter-view-btn', n_clicks=0),
                 html.Div(id='value-setter-view-output', className='output-datatable')
             ]
-        )
+        ),
+        build_what_if_panel(),
+        build_correlation_panel()
+    ]
+
+
+def build_what_if_panel():
+    return html.Div(
+        id='what-if-container',
+        className='twelve columns',
+        children=[
+            generate_section_banner('What-If Control Limits'),
+            html.P("OOC% and false alarms (OOC but within spec) for control limits at each sigma width. "
+                   "Click a point to load its UCL and LCL, then Update to save them."),
+            dcc.Graph(id='what-if-graph')
+        ]
+    )
+
+
+# Sorted copy of each parameter's history for the what-if grid, rebuilt when rows arrive
+sorted_history = {}
+
+
+def sorted_values(param):
+    version, values = sorted_history.get(param, (None, None))
+    if version != history.version:
+        values = history.column(param)
+        values = np.sort(values[~np.isnan(values)])
+        sorted_history[param] = (history.version, values)
+    return values
+
+
+def generate_what_if_graph(param, limits, widths=np.arange(0.5, 4.0001, 0.05)):
+    """OOC% and false-alarm% for control limits at mean +/- k sigma over a grid of k, in one pass"""
+    stats = state_dict[param]['stats']
+    mean, std = stats.mean, stats.std
+    ucls, lcls = mean + widths * std, mean - widths * std
+    ooc_rates, false_alarm_rates = limit_grid_rates(
+        sorted_values(param), len(history), ucls, lcls, limits['usl'], limits['lsl']
+    )
+    customdata = np.round(np.column_stack([ucls, lcls]), 3).tolist()
+    hovertemplate = '%{x:.2f} sigma: %{y:.2f}%<br>UCL %{customdata[0]}, LCL %{customdata[1]}<extra></extra>'
+
+    shapes = []
+    if std > 0:
+        current = (limits['ucl'] - limits['lcl']) / (2 * std)
+        shapes.append({
+            'type': 'line', 'xref': 'x', 'yref': 'paper', 'x0': current, 'x1': current, 'y0': 0, 'y1': 1,
+            'line': {'color': '#95969A', 'dash': 'dot'}
+        })
+
+    return {
+        'data': [
+            {
+                'x': widths.tolist(),
+                'y': (ooc_rates * 100).tolist(),
+                'customdata': customdata,
+                'hovertemplate': hovertemplate,
+                'mode': 'lines+markers',
+                'name': 'OOC %',
+                'line': {'color': '#119DFF'}
+            },
+            {
+                'x': widths.tolist(),
+                'y': (false_alarm_rates * 100).tolist(),
+                'customdata': customdata,
+                'hovertemplate': hovertemplate,
+                'mode': 'lines+markers',
+                'name': 'False alarm %',
+                'line': {'color': '#EF553B'}
+            }
+        ],
+        'layout': {
+            'uirevision': param,
+            'xaxis': {'title': 'Control limits at mean +/- k sigma', 'gridcolor': '#636363'},
+            'yaxis': {'title': f'{param} batches (%)', 'gridcolor': '#636363'},
+            'shapes': shapes,
+            'showlegend': True,
+            'legend': {'font': {'color': '#95969A'}},
+            'paper_bgcolor': 'rgb(45, 48, 56)',
+            'plot_bgcolor': 'rgb(45, 48, 56)',
+            'font': {'color': '#95969A'},
+            'margin': {'l': 70, 'b': 50, 't': 30, 'r': 30},
+            'hovermode': 'closest'
+        }
+    }
+
+
+def build_correlation_panel():
+    return html.Div(
+        id='correlation-container',
+        className='twelve columns',
+        children=[
+            generate_section_banner('Cross-Parameter Correlation'),
+            html.Div(
+                className='seven columns',
+                children=dcc.Graph(id='correlation-heatmap', figure=generate_correlation_heatmap())
+            ),
+            html.Div(
+                className='five columns',
+                children=[
+                    html.Label('Related parameters (strongest lagged correlation with the selected metric)'),
+                    html.Div(id='root-cause-output', className='output-datatable')
+                ]
+            )
+        ]
+    )
+
+
+def generate_correlation_heatmap():
+    """Lag-0 correlation heatmap read from the cached co-moment accumulators"""
+    labels = correlation_state.columns
+    return {
+        'data': [{
+            'z': np.round(correlation_state.correlation(), 3).tolist(),
+            'x': labels,
+            'y': labels,
+            'type': 'heatmap',
+            'zmin': -1,
+            'zmax': 1,
+            'colorscale': 'RdBu',
+            'reversescale': True
+        }],
+        'layout': {
+            'paper_bgcolor': 'rgb(45, 48, 56)',
+            'plot_bgcolor': 'rgb(45, 48, 56)',
+            'font': {'color': '#95969A'},
+            'margin': {'l': 100, 'b': 100, 't': 30, 'r': 30}
+        }
+    }
+
+
+def create_root_cause_table(dd_select, top_n=10):
+    if dd_select not in correlation_state.columns:
+        return html.Div("No data available")
+
+    table_data = [
+        {
+            'Parameter': item['param'],
+            'Lag (batches)': item['lag'],
+            'Correlation': round(item['corr'], 3)
+        }
+        for item in correlation_state.rank_related(dd_select)[:top_n]
     ]
 
+    return dash_table.DataTable(
+        data=table_data,
+        columns=[{'name': name, 'id': name} for name in ['Parameter', 'Lag (batches)', 'Correlation']],
+        style_header={
+            'backgroundColor': '#2d3038',
+            'color': '#95969A',
+            'fontWeight': 'bold'
+        },
+        style_cell={
+            'backgroundColor': '#2d3038',
+            'color': '#95969A',
+            'textAlign': 'left',
+            'padding': '10px'
+        },
+        style_table={
+            'overflowX': 'auto'
+        }
+    )
+
 
 def build_value_setter_line(line_num, label, value, col3):
     if line_num == 'value-setter-panel-header':
@@ -390,44 +1111,6 @@ def generate_modal():
     )
 
 
-def create_specs_table(stored_data, dd_select):
-    """Create a table showing current specification limits for the selected parameter"""
-    if not stored_data or dd_select not in stored_data:
-        return html.Div("No data available")
-        
-    data = stored_data[dd_select]
-    
-    # Create the data for the table
-    table_data = [
-        {"Limit Type": "Upper Specification Limit (USL)", "Value": data['usl']},
-        {"Limit Type": "Lower Specification Limit (LSL)", "Value": data['lsl']},
-        {"Limit Type": "Upper Control Limit (UCL)", "Value": data['ucl']},
-        {"Limit Type": "Lower Control Limit (LCL)", "Value": data['lcl']}
-    ]
-    
-    return dash_table.DataTable(
-        data=table_data,
-        columns=[
-            {"name": "Limit Type", "id": "Limit Type"},
-            {"name": "Value", "id": "Value", "type": "numeric", 
-             "format": {"specifier": ".3f"}}
-        ],
-        style_header={
-            'backgroundColor': '#2d3038',
-            'color': '#95969A',
-            'fontWeight': 'bold'
-        },
-        style_cell={
-            'backgroundColor': '#2d3038',
-            'color': '#95969A',
-            'textAlign': 'left',
-            'padding': '10px'
-        },
-        style_table={
-            'overflowX': 'auto'
-        }
-    )
-
 # Callbacks start here
 @app.callback(
     [Output('value-setter-panel', 'children'),
@@ -474,71 +1157,77 @@ def update_value_setter_panel(dd_select, stored_data):
     Output('value-setter-store', 'data'),
     [Input('value-setter-set-btn', 'n_clicks')],
     [State('metric-select-dropdown', 'value'),
-     State('value-setter-store', 'data'),
      State('ud_usl_input', 'value'),
      State('ud_lsl_input', 'value'),
      State('ud_ucl_input', 'value'),
      State('ud_lcl_input', 'value')],
     prevent_initial_call=True
 )
-def update_value_setter_store(n_clicks, metric, stored_data, usl, lsl, ucl, lcl):
-    if n_clicks is None:
+def update_value_setter_store(n_clicks, metric, usl, lsl, ucl, lcl):
+    """Save the edited limits and patch only that metric's limits and OOC summary in the store"""
+    if n_clicks is None or metric not in default_limits:
         return no_update
-        
-    new_data = copy.deepcopy(stored_data)
-    
+
     try:
-        if metric in new_data:
-            changed = False
-            if usl is not None:
-                new_data[metric]['usl'] = float(usl)
-                changed = True
-            if lsl is not None:
-                new_data[metric]['lsl'] = float(lsl)
-                changed = True
-            if ucl is not None:
-                new_data[metric]['ucl'] = float(ucl)
-                changed = True
-            if lcl is not None:
-                new_data[metric]['lcl'] = float(lcl)
-                changed = True
-            
-            if changed:
-                # Recalculate OOC based on new limits
-                new_data[metric]['ooc'] = populate_ooc(
-                    new_data[metric]['data'],
-                    new_data[metric]['ucl'],
-                    new_data[metric]['lcl']
-                )
-                
-                print(f"Debug - Updated values for {metric}: {new_data[metric]}")  # Debug print
-                return new_data
-            
+        new_limits = {
+            key: float(value)
+            for key, value in zip(LIMIT_KEYS, (usl, lsl, ucl, lcl))
+            if value is not None
+        }
+        if not new_limits:
+            return no_update
+
+        limits_repo.put(metric, new_limits)
+        limits = current_limits(metric)
+
+        # Recounts OOC for the metrics whose limits moved, this one included, in a single pass
+        sync_state_limits()
+        ooc_count, ooc_rate = state_dict[metric]['ooc_count'], state_dict[metric]['ooc_rate']
+
+        patch = Patch()
+        for key in LIMIT_KEYS:
+            patch[metric][key] = limits[key]
+        patch[metric]['ooc_count'] = ooc_count
+        patch[metric]['ooc_rate'] = ooc_rate
+
+        logger.debug("Updated limits", extra={'fields': {'param': metric, **limits, 'ooc_count': ooc_count}})
+        return patch
+
     except Exception as e:
-        print(f"Error updating values: {e}")
-    
-    return stored_data
+        logger.error("Error updating limits", extra={'fields': {'param': metric, 'error': repr(e)}})
 
+    return no_update
 
-@app.callback(
+
+# The current-specs table is rebuilt in the browser from the store (assets/spc_ui.js),
+# after a saved edit it follows the store patch rather than the button click
+app.clientside_callback(
+    ClientsideFunction(namespace='spc_ui', function_name='current_specs'),
     Output('value-setter-view-output', 'children'),
     [Input('value-setter-view-btn', 'n_clicks'),
-     Input('value-setter-set-btn', 'n_clicks'),
+     Input('value-setter-store', 'data'),
      Input('metric-select-dropdown', 'value')],
-    [State('value-setter-store', 'data')],
     prevent_initial_call=True
 )
-def show_current_specs(view_clicks, set_clicks, dd_select, stored_data):
-    ctx = callback_context
-    if not ctx.triggered:
-        return ''
-    
-    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    
-    if trigger_id == 'value-setter-view-btn' and view_clicks == 0:
-        return ''
-        
-    return create_specs_table(stored_data, dd_select)
+
+
+@app.callback(
+    Output('what-if-graph', 'figure'),
+    [Input('metric-select-dropdown', 'value'),
+     Input('value-setter-store', 'data')]
+)
+def update_what_if_graph(dd_select, stored_data):
+    if not stored_data or dd_select not in stored_data:
+        return no_update
+    return generate_what_if_graph(dd_select, stored_data[dd_select])
+
+
+@app.callback(
+    Output('root-cause-output', 'children'),
+    [Input('metric-select-dropdown', 'value')]
+)
+def update_root_cause_ranking(dd_select):
+    return create_root_cause_table(dd_select)
 
 
 def generate_section_banner(title):
@@ -549,6 +1238,7 @@ def generate_section_banner(title):
 
 
 def build_top_panel():
+    rows, page, page_label = build_metric_page('params', 0)
     return html.Div(
         id='top-section-container',
         className='row',
@@ -561,15 +1251,15 @@ def build_top_panel():
                 style={'height': '100%'},
                 children=[
                     generate_section_banner('Process Control Metrics Summary'),
+                    build_metric_list_controls(page, page_label),
                     generate_metric_list_header(),
                     html.Div(
+                        id='metric-rows',
                         style={
-                            'height': 'calc(100% - 90px)',
+                            'height': 'calc(100% - 130px)',
                             'overflow-y': 'scroll'
                         },
-                        children=[
-                            generate_metric_row_helper(i) for i in range(1, len(params))
-                        ]
+                        children=rows
                     )
                 ]
             ),
@@ -586,6 +1276,43 @@ def build_top_panel():
     )
 
 
+def build_metric_list_controls(page, page_label):
+    return html.Div(
+        id='metric-list-controls',
+        className='row',
+        style={'height': '30px', 'margin': '5px 0px'},
+        children=[
+            dcc.Dropdown(
+                id='metric-sort',
+                className='four columns',
+                options=[
+                    {'label': 'Dataset order', 'value': 'params'},
+                    {'label': 'OOC% (worst first)', 'value': 'ooc'}
+                ],
+                value='params',
+                clearable=False
+            ),
+            html.Button('Prev', id='metric-page-prev', n_clicks=0),
+            html.Span(id='metric-page-label', children=page_label, style={'margin': '0px 10px'}),
+            html.Button('Next', id='metric-page-next', n_clicks=0),
+            dcc.Store(id='metric-page', data=page, storage_type='memory')
+        ]
+    )
+
+
+def build_metric_page(sort_by, page):
+    """Rows for one page of the chosen ordering, the page clamped to the ones that exist"""
+    order = metric_order.get(sort_by, metric_order['params'])
+    n_pages = max(1, -(-len(order) // METRIC_PAGE_SIZE))
+    page = min(max(page, 0), n_pages - 1)
+    visible = order[page * METRIC_PAGE_SIZE:(page + 1) * METRIC_PAGE_SIZE]
+    return (
+        [generate_metric_row_helper(param) for param in visible],
+        page,
+        f"Page {page + 1} of {n_pages} ({len(order)} parameters)"
+    )
+
+
 def generate_piechart():
     return dcc.Graph(
         id='piechart',
@@ -593,7 +1320,7 @@ def generate_piechart():
             'data': [
                 {
                     'labels': params[1:],
-                    'values': [1, 1, 1, 1, 1, 1, 1],
+                    'values': [1] * len(params[1:]),
                     'type': 'pie',
                     'marker': {'line': {'color': '#53555B', 'width': 2}},
                     'hoverinfo': 'label',
@@ -643,27 +1370,45 @@ def generate_metric_list_header():
         })
 
 
-def generate_metric_row_helper(index):
-    item = params[index]
-
-    div_id = item + suffix_row
-    button_id = item + suffix_button_id
-    sparkline_graph_id = item + suffix_sparkline_graph
-    count_id = item + suffix_count
-    ooc_percentage_id = item + suffix_ooc_n
-    ooc_graph_id = item + suffix_ooc_g
-    indicator_id = item + suffix_indicator
-
-    # Get all data points for sparkline
-    x_array = df['Batch'].tolist()
-    y_array = df[item].tolist()
+def generate_metric_row_helper(item):
+    div_id = metric_id(item, suffix_row)
+    button_id = metric_id(item, suffix_button_id)
+    sparkline_graph_id = metric_id(item, suffix_sparkline_graph)
+    count_id = metric_id(item, suffix_count)
+    ooc_percentage_id = metric_id(item, suffix_ooc_n)
+    ooc_graph_id = metric_id(item, suffix_ooc_g)
+    indicator_id = metric_id(item, suffix_indicator)
+
+    y_values = history.column(item)
+    if SPARKLINE_MODE == 'svg':
+        sparkline = html.Img(
+            id=sparkline_graph_id,
+            src=sparkline_svg_uri(y_values),
+            style={'width': '100%', 'height': '95%'}
+        )
+    else:
+        # Get all data points for sparkline
+        sparkline = dcc.Graph(
+            id=sparkline_graph_id,
+            style={
+                'width': '100%',
+                'height': '95%',
+            },
+            config={
+                'staticPlot': False,
+                'editable': False,
+                'displayModeBar': False
+            },
+            figure=sparkline_figure(history.tolist('Batch'), history.tolist(item), item)
+        )
 
     return generate_metric_row(
         div_id, None,
         {
-            'id': item,
+            'id': metric_id(item, '_name'),
             'children': html.Button(
                 id=button_id,
+                className='metric-button',
                 children=item,
                 title="Click to visualize live SPC chart",
                 n_clicks=0
@@ -671,50 +1416,21 @@ def generate_metric_row_helper(index):
         },
         {
             'id': count_id,
-            'children': str(len(y_array))  # Show total count
+            'children': str(len(y_values))  # Show total count
         },
         {
-            'id': item + '_sparkline',
-            'children': dcc.Graph(
-                id=sparkline_graph_id,
-                style={
-                    'width': '100%',
-                    'height': '95%',
-                },
-                config={
-                    'staticPlot': False,
-                    'editable': False,
-                    'displayModeBar': False
-                },
-                figure={
-                    'data': [{
-                        'x': x_array,
-                        'y': y_array,
-                        'mode': 'lines+markers',
-                        'name': item,
-                        'line': {'color': 'rgb(255,209,95)'}
-                    }],
-                    'layout': {
-                        'uirevision': True,
-                        'margin': dict(l=0, r=0, t=4, b=4, pad=0),
-                        'paper_bgcolor': 'rgb(45, 48, 56)',
-                        'plot_bgcolor': 'rgb(45, 48, 56)',
-                        'showgrid': False,
-                        'showaxis': False,
-                        'zeroline': False,
-                        'showticklabels': False
-                    }
-                }
-            )
+            'id': metric_id(item, '_sparkline'),
+            'children': sparkline
         },
         {
             'id': ooc_percentage_id,
             'children': '0.00%'
         },
         {
-            'id': ooc_graph_id + '_container',
+            'id': metric_id(item, suffix_ooc_g + '_container'),
             'children': daq.GraduatedBar(
                 id=ooc_graph_id,
+                className='metric-ooc-bar',
                 color={"gradient": True, "ranges": {"green": [0, 3], "yellow": [3, 7], "red": [7, 15]}},
                 showCurrentValue=False,
                 max=15,
@@ -722,7 +1438,7 @@ def generate_metric_row_helper(index):
             )
         },
         {
-            'id': item + '_pf',
+            'id': metric_id(item, '_pf'),
             'children': daq.Indicator(
                 id=indicator_id,
                 value=True,
@@ -797,29 +1513,44 @@ def build_chart_panel():
         className='twelve columns',
         children=[
             generate_section_banner('Live SPC Chart'),
-            dcc.Graph(
-                id="control-chart-live",
-                figure=go.Figure({
-                    'data': [
-                        {
-                            'x': [],
-                            'y': [],
-                            'mode': 'lines+markers',
-                            'name': params[1]
-                        }
-                    ],
-                    'layout': {
-                        'paper_bgcolor': 'rgb(45, 48, 56)',
-                        'plot_bgcolor': 'rgb(45, 48, 56)',
-                        'showlegend': True,
-                        'legend': {'font': {'color': '#95969A'}},
-                        'font': {'color': '#95969A'},
-                        'xaxis': {'title': 'Batch'},
-                        'yaxis': {'title': params[1]},
-                        'margin': {'l': 70, 'b': 70, 't': 70, 'r': 70}
-                    }
-                })
-            )
+            html.Div(
+                className='row',
+                children=[
+                    html.Div(
+                        className='nine columns',
+                        children=[
+                            dcc.Graph(
+                                id="control-chart-live",
+                                figure=go.Figure({
+                                    'data': [
+                                        {
+                                            'x': [],
+                                            'y': [],
+                                            'mode': 'lines+markers',
+                                            'name': params[1]
+                                        }
+                                    ],
+                                    'layout': {
+                                        'paper_bgcolor': 'rgb(45, 48, 56)',
+                                        'plot_bgcolor': 'rgb(45, 48, 56)',
+                                        'showlegend': True,
+                                        'legend': {'font': {'color': '#95969A'}},
+                                        'font': {'color': '#95969A'},
+                                        'xaxis': {'title': 'Batch'},
+                                        'yaxis': {'title': params[1]},
+                                        'margin': {'l': 70, 'b': 70, 't': 70, 'r': 70}
+                                    }
+                                })
+                            )
+                        ]
+                    ),
+                    html.Div(
+                        className='three columns',
+                        children=dcc.Graph(id='histogram-live', figure=go.Figure({'data': [], 'layout': HISTOGRAM_LAYOUT}))
+                    )
+                ]
+            ),
+            html.Div(id='batch-drilldown', style={'padding': '0 20px 20px'})
         ]
     )
 
@@ -829,9 +1560,10 @@ def generate_graph(interval, stored_data, param):
     if param not in stored_data:
         return {'data': [], 'layout': {}}
     
-    # Use all data points
-    x_array = df['Batch'].tolist()
-    y_array = df[param].tolist()
+    # Use all data points, after the downsampled series of any archived rows
+    display = archive.display[param]
+    x_array = display.x.tolist() + history.tolist('Batch')
+    y_array = display.y.tolist() + history.tolist(param)
     
     return {
         'data': [
@@ -891,9 +1623,194 @@ def generate_graph(interval, stored_data, param):
     }
 
 
-@app.callback(
+HISTOGRAM_LAYOUT = {
+    'paper_bgcolor': 'rgb(45, 48, 56)',
+    'plot_bgcolor': 'rgb(45, 48, 56)',
+    'font': {'color': '#95969A'},
+    'showlegend': False,
+    'bargap': 0,
+    'margin': {'l': 50, 'b': 70, 't': 70, 'r': 20}
+}
+
+
+def generate_histogram(param, limits, max_bins=40):
+    """Distribution of a parameter against its limits, drawn sideways to share the control chart's value axis.
+
+    Built from the fixed-edge bin counts kept in the SPC state, so its cost
+    does not depend on the history length; the range shown follows the
+    current limits by merging bins.
+    """
+    entry = state_dict[param]
+    stats = entry['stats']
+    low = min(limits['lsl'], limits['lcl'], stats.mean - 4 * stats.std)
+    high = max(limits['usl'], limits['ucl'], stats.mean + 4 * stats.std)
+    pad = (high - low) * 0.05
+    edges, counts, underflow, overflow = entry['hist'].view(low - pad, high + pad, max_bins)
+    centres = (edges[:-1] + edges[1:]) / 2
+    in_spec = (centres >= limits['lsl']) & (centres <= limits['usl'])
+
+    shapes = [
+        {
+            'type': 'line', 'xref': 'paper', 'yref': 'y', 'x0': 0, 'x1': 1, 'y0': limits[key], 'y1': limits[key],
+            'line': {'color': color, 'dash': dash}
+        }
+        for key, color, dash in (('ucl', '#EF553B', 'dash'), ('lcl', '#EF553B', 'dash'),
+                                 ('usl', '#FF9900', 'dot'), ('lsl', '#FF9900', 'dot'))
+    ]
+    annotations = [
+        {'xref': 'paper', 'yref': 'paper', 'x': 1, 'y': y, 'showarrow': False, 'text': text}
+        for y, text in ((1.02, f'{overflow} above'), (-0.12, f'{underflow} below'))
+        if not text.startswith('0 ')
+    ]
+
+    return {
+        'data': [{
+            'type': 'bar',
+            'orientation': 'h',
+            'y': centres.tolist(),
+            'x': counts.tolist(),
+            'width': float(edges[1] - edges[0]),
+            'marker': {'color': np.where(in_spec, '#119DFF', '#EF553B').tolist()},
+            'name': param,
+            'hovertemplate': '%{y:.4g}: %{x} batches<extra></extra>'
+        }],
+        'layout': {
+            **HISTOGRAM_LAYOUT,
+            'uirevision': param,
+            'xaxis': {'title': 'Batches', 'gridcolor': '#636363'},
+            'yaxis': {'title': param, 'gridcolor': '#636363'},
+            'shapes': shapes,
+            'annotations': annotations
+        }
+    }
+
+
+def batch_row(point):
+    """History row behind a clicked control chart point, or None for an archived batch.
+
+    Every trace of the chart shares one x array, the archive's downsampled
+    points followed by one point per history row, so the point number gives
+    the row directly. The Batch index is the fallback when that does not
+    line up with the clicked batch.
+    """
+    batch = point.get('x')
+    batches = history.column('Batch')
+    offsets = {len(display.x) for display in archive.display.values()} if archive.n_rows else {0}
+    for offset in offsets:
+        row = point.get('pointNumber', -1) - offset
+        if 0 <= row < len(batches) and batches[row] == batch:
+            return row
+    return history.find('Batch', batch)
+
+
+def create_drilldown_table(row):
+    """Every parameter's value at one history row, against its current limits"""
+    values = history.row(row)
+    limits = rule_limits(params[1:])
+    title = f"Batch {values['Batch']}"
+    if TIME_COLUMN:
+        title += f" at {pd.to_datetime(values[TIME_COLUMN], unit='s', utc=True):%Y-%m-%d %H:%M:%S} UTC"
+
+    table_data = []
+    for param in params[1:]:
+        value = values[param]
+        ooc = bool(ooc_mask(value, limits[param]['ucl'], limits[param]['lcl']))
+        table_data.append({
+            'Parameter': param,
+            'Value': None if np.isnan(value) else round(value, history.decimals.get(param) or 6),
+            **{key.upper(): round(limits[param][key], 3) for key in ('lcl', 'ucl', 'lsl', 'usl')},
+            'Status': 'OOC' if ooc else 'In control'
+        })
+
+    return html.Div([
+        html.H6(title, style={'color': '#95969A'}),
+        dash_table.DataTable(
+            data=table_data,
+            columns=[{'name': name, 'id': name}
+                     for name in ['Parameter', 'Value', 'LCL', 'UCL', 'LSL', 'USL', 'Status']],
+            style_header={
+                'backgroundColor': '#2d3038',
+                'color': '#95969A',
+                'fontWeight': 'bold'
+            },
+            style_cell={
+                'backgroundColor': '#2d3038',
+                'color': '#95969A',
+                'textAlign': 'left',
+                'padding': '10px'
+            },
+            style_data_conditional=[{
+                'if': {'filter_query': '{Status} = "OOC"'},
+                'color': theme['secondary']
+            }],
+            style_table={
+                'overflowX': 'auto'
+            }
+        )
+    ])
+
+
+def build_multivariate_panel():
+    return html.Div(
+        id='t2-chart-container',
+        className='twelve columns',
+        children=[
+            generate_section_banner(f'Multivariate Hotelling T\u00b2 Chart ({len(multivariate_params)} parameters)'),
+            dcc.Graph(
+                id='t2-chart',
+                figure=generate_t2_graph()
+            )
+        ]
+    )
+
+
+def generate_t2_graph(max_points=2000):
+    """T2 statistic per batch against its chi-square UCL, downsampled for display"""
+    x_array, y_array = downsample_minmax(t2_chart.batch, t2_chart.t2, max_points)
+    ucl = t2_chart.ucl
+    above_ucl = y_array > ucl
+
+    return {
+        'data': [
+            {
+                'x': x_array.tolist(),
+                'y': y_array.tolist(),
+                'mode': 'lines+markers',
+                'name': 'T\u00b2',
+                'line': {'color': '#119DFF'},
+                'marker': {'color': np.where(above_ucl, '#EF553B', '#119DFF').tolist()}
+            },
+            {
+                'x': [x_array[0].item(), x_array[-1].item()] if len(x_array) else [],
+                'y': [ucl, ucl],
+                'mode': 'lines',
+                'name': 'UCL',
+                'line': {'color': '#EF553B', 'dash': 'dash'}
+            }
+        ],
+        'layout': {
+            'uirevision': 't2',
+            'xaxis': {'title': 'Batch', 'gridcolor': '#636363', 'showgrid': True},
+            'yaxis': {'title': 'T\u00b2', 'gridcolor': '#636363', 'showgrid': True},
+            'showlegend': True,
+            'legend': {'font': {'color': '#95969A'}},
+            'paper_bgcolor': 'rgb(45, 48, 56)',
+            'plot_bgcolor': 'rgb(45, 48, 56)',
+            'font': {'color': '#95969A'},
+            'margin': {'l': 70, 'b': 70, 't': 70, 'r': 70},
+            'hovermode': 'closest',
+            'title': f'OOC: {t2_chart.ooc_count()} of {len(t2_chart.t2)} batches'
+        }
+    }
+
+
+# Both tabs stay mounted, switching only toggles their visibility (assets/spc_ui.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='spc_ui', function_name='render_tab'),
     [Output('app-tabs', 'value'),
-     Output('app-content', 'children'),
+     Output('tab1-content', 'style'),
+     Output('tab2-content', 'style'),
+     Output('tab3-content', 'style'),
      Output('Specs-tab', 'disabled'),
      Output('Control-chart-tab', 'disabled'),
      Output('tab-trigger-btn', 'style')],
@@ -901,161 +1818,214 @@ def generate_graph(interval, stored_data, param):
      Input('app-tabs', 'value')],  # Add input from tab clicks
     prevent_initial_call=True
 )
-def render_tab_content(tab_switch, tab_value):
-    ctx = callback_context
-    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-
-    if trigger_id == 'app-tabs':
-        # Handle tab clicks
-        if tab_value == 'tab1':
-            return [
-                'tab1',
-                build_tab_1(),
-                False,  # Specs-tab not disabled
-                False,  # Control-chart-tab not disabled
-                {'display': 'inline-block', 'float': 'right'}
-            ]
-        else:  # tab2
-            return [
-                'tab2',
-                html.Div([
-                    build_top_panel(),
-                    build_chart_panel()
-                ]),
-                False,  # Specs-tab not disabled
-                False,  # Control-chart-tab not disabled
-                {'display': 'none'}
-            ]
-    else:  # Handle button click
-        if tab_switch == 0:
-            return [
-                'tab1',
-                build_tab_1(),
-                False,
-                False,
-                {'display': 'inline-block', 'float': 'right'}
-            ]
+
+
+def build_plant_panel():
+    return html.Div(
+        id='plant-container',
+        className='twelve columns',
+        children=[
+            generate_section_banner(f'Plant Summary ({PLANT_DIR})'),
+            html.Button('Refresh', id='plant-refresh-btn', n_clicks=0),
+            html.Div(id='plant-summary-output', className='output-datatable')
+        ]
+    )
+
+
+def create_plant_table(summary):
+    """OOC% per line and parameter, with the plant-wide totals as the first row"""
+    plant_params = list(summary['params'])
+    table_data = [{
+        'Line': 'Plant',
+        'Batches': summary['rows'],
+        **{param: round(total['ooc_rate'] * 100, 2) for param, total in summary['params'].items()}
+    }]
+    for line in summary['lines']:
+        table_data.append({
+            'Line': line['line'],
+            'Batches': line['rows'],
+            **{param: round(item['ooc_rate'] * 100, 2) for param, item in line['params'].items()}
+        })
+
+    return dash_table.DataTable(
+        data=table_data,
+        columns=[{'name': 'Line', 'id': 'Line'}, {'name': 'Batches', 'id': 'Batches'}] + [
+            {'name': f'{param} OOC%', 'id': param, 'type': 'numeric'} for param in plant_params
+        ],
+        sort_action='native',
+        style_header={
+            'backgroundColor': '#2d3038',
+            'color': '#95969A',
+            'fontWeight': 'bold'
+        },
+        style_cell={
+            'backgroundColor': '#2d3038',
+            'color': '#95969A',
+            'textAlign': 'left',
+            'padding': '10px'
+        },
+        style_data_conditional=[
+            # Same threshold as the metric row indicators
+            {'if': {'filter_query': f'{{{param}}} >= 6', 'column_id': param}, 'color': theme['secondary']}
+            for param in plant_params
+        ],
+        style_table={
+            'overflowX': 'auto'
+        }
+    )
+
+
+if plant_monitor:
+    @app.callback(
+        Output('plant-summary-output', 'children'),
+        [Input('plant-refresh-btn', 'n_clicks')]
+    )
+    def update_plant_summary(n_clicks):
+        summary, recomputed = plant_monitor.refresh()
+        if not summary['lines']:
+            return html.Div(f"No line files found in {PLANT_DIR}")
         return [
-            'tab2',
-            html.Div([
-                build_top_panel(),
-                build_chart_panel()
-            ]),
-            False,  # Changed from True to False
-            False,
-            {'display': 'none'}
+            html.P(f"{len(summary['lines'])} lines, {summary['rows']} batches, "
+                   f"plant OOC {summary['ooc_rate'] * 100:.2f}%, "
+                   f"recomputed: {', '.join(os.path.basename(path) for path in recomputed) or 'none'}"),
+            create_plant_table(summary)
         ]
 
 
 # ======= Callbacks for modal popup =======
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='spc_ui', function_name='markdown_visibility'),
     Output("markdown", "style"),
     [Input("learn-more-button", "n_clicks"),
      Input("markdown_close", "n_clicks")]
 )
-def update_markdown_visibility(button_click, close_click):
-    ctx = callback_context
-
-    if not ctx.triggered:
-        return {"display": "none"}
-    
-    prop_id = ctx.triggered[0]["prop_id"].split(".")[0]
-    
-    if prop_id == "learn-more-button":
-        return {"display": "block"}
-    elif prop_id == "markdown_close":
-        return {"display": "none"}
-    
-    return {"display": "none"}  # default case
 
 
 # Control chart callback
 @app.callback(
-    Output('control-chart-live', 'figure'),
-    [Input(param + suffix_button_id, 'n_clicks') for param in params[1:]],
+    [Output('control-chart-live', 'figure'),
+     Output('histogram-live', 'figure')],
+    [Input(metric_id(ALL, suffix_button_id), 'n_clicks')],
     [State('value-setter-store', 'data')]
 )
-def update_control_chart(*args):
-    stored_data = args[-1]  # Last argument is the stored_data State
-    
+def update_control_chart(n_clicks, stored_data):
     ctx = callback_context
     if not ctx.triggered:
-        return generate_graph(None, stored_data, params[1])  # Default to first parameter
+        param = params[1]  # Default to first parameter
+
+    # Rows mounted by a page change report n_clicks 0, only an actual click switches the chart
+    elif not ctx.triggered[0]['value']:
+        return no_update, no_update
 
     # Get the parameter that triggered the callback
-    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    param = trigger_id.replace(suffix_button_id, '')  # Remove '_button' suffix
-    
-    return generate_graph(None, stored_data, param)
+    else:
+        param = ctx.triggered_id['index']
 
+    if param not in stored_data:
+        return generate_graph(None, stored_data, param), no_update
+    return generate_graph(None, stored_data, param), generate_histogram(param, stored_data[param])
 
-# Parameter row update callbacks
-def create_param_callback(param):
-    @app.callback(
-        [Output(param + suffix_count, 'children'),
-         Output(param + suffix_sparkline_graph, 'extendData'),
-         Output(param + suffix_ooc_n, 'children'),
-         Output(param + suffix_ooc_g, 'value'),
-         Output(param + suffix_indicator, 'color')],
-        [Input(param + suffix_button_id, 'n_clicks')],
-        [State('value-setter-store', 'data')]
-    )
-    def update_param_row(n_clicks, stored_data):
-        if n_clicks is None:
-            return '0', {'x': [[]], 'y': [[]]}, '0.00%', 0.00001, theme['primary']
 
-        # Get the data for this parameter
-        param_data = stored_data.get(param, {})
-        count = str(len(param_data.get('data', [])))
-        
-        # Calculate OOC
-        ooc_list = param_data.get('ooc', [])
-        if ooc_list:
-            ooc_n = f"{(ooc_list[-1] * 100):.2f}%"
-            ooc_g_value = (ooc_list[-1] * 100) + 0.00001  # Add small value to prevent zero
-        else:
-            ooc_n = '0.00%'
-            ooc_g_value = 0.00001
-
-        # Determine indicator color
-        indicator = theme['primary'] if ooc_g_value < 6 else theme['secondary']
-        
-        # Update sparkline
-        spark_line_data = {
-            'x': [[len(param_data.get('data', []))]],
-            'y': [[param_data.get('data', [])[-1] if param_data.get('data', []) else 0]]
-        }
+# Batch drilldown, every parameter at the clicked point's batch
+@app.callback(
+    Output('batch-drilldown', 'children'),
+    [Input('control-chart-live', 'clickData')],
+    prevent_initial_call=True
+)
+def update_batch_drilldown(click_data):
+    if not click_data or not click_data.get('points'):
+        return no_update
+    row = batch_row(click_data['points'][0])
+    if row is None:
+        return html.Div(f"Batch {click_data['points'][0].get('x')} is in the archived history, "
+                        "only its summary is kept in memory")
+    return create_drilldown_table(row)
 
-        return count, spark_line_data, ooc_n, ooc_g_value, indicator
 
+# Metric list paging, rebuilds only the rows of the page being shown
+@app.callback(
+    [Output('metric-rows', 'children'),
+     Output('metric-page', 'data'),
+     Output('metric-page-label', 'children')],
+    [Input('metric-page-prev', 'n_clicks'),
+     Input('metric-page-next', 'n_clicks'),
+     Input('metric-sort', 'value')],
+    [State('metric-page', 'data')],
+    prevent_initial_call=True
+)
+def update_metric_page(prev_clicks, next_clicks, sort_by, page):
+    trigger_id = callback_context.triggered[0]['prop_id'].split('.')[0]
+    if trigger_id == 'metric-page-prev':
+        page -= 1
+    elif trigger_id == 'metric-page-next':
+        page += 1
+    else:  # A new ordering starts from its first page
+        page = 0
+
+    # Saved limits change OOC%, pick them up before paging through the ranking
+    sync_state_limits()
+    return build_metric_page(sort_by, page)
 
-# Create callbacks for each parameter
-for param in params[1:]:  # Skip 'Batch' parameter
-    create_param_callback(param)
+
+# Parameter row update callback, one definition serving whichever rows are mounted
+@app.callback(
+    [Output(metric_id(MATCH, suffix_count), 'children'),
+     Output(metric_id(MATCH, suffix_sparkline_graph), sparkline_prop),
+     Output(metric_id(MATCH, suffix_ooc_n), 'children'),
+     Output(metric_id(MATCH, suffix_ooc_g), 'value'),
+     Output(metric_id(MATCH, suffix_indicator), 'color')],
+    [Input(metric_id(MATCH, suffix_button_id), 'n_clicks')],
+    [State(metric_id(MATCH, suffix_button_id), 'id')]
+)
+def update_param_row(n_clicks, button_id):
+    if n_clicks is None:
+        empty_sparkline = no_update if SPARKLINE_MODE == 'svg' else {'x': [[]], 'y': [[]]}
+        return '0', empty_sparkline, '0.00%', 0.00001, theme['primary']
+
+    # Get the live server-side state for this parameter
+    param = button_id['index']
+    sync_state_limits()
+    param_data = state_dict[param]
+    count = str(param_data['count'])
+    
+    # Calculate OOC
+    ooc_rate = param_data['ooc_rate']
+    ooc_n = f"{(ooc_rate * 100):.2f}%"
+    ooc_g_value = (ooc_rate * 100) + 0.00001  # Add small value to prevent zero
+
+    # Determine indicator color
+    indicator = theme['primary'] if ooc_g_value < 6 else theme['secondary']
+    
+    # Update sparkline, the svg image is kept current by the push channel
+    data = history.column(param)
+    if SPARKLINE_MODE == 'svg':
+        spark_line_data = no_update
+    else:
+        spark_line_data = {
+            'x': [[len(data)]],
+            'y': [history.tolist(param, -1) if len(data) else [0]]
+        }
+
+    return count, spark_line_data, ooc_n, ooc_g_value, indicator
 
 
 # Update piechart callback
 @app.callback(
     Output('piechart', 'figure'),
-    [Input(param + suffix_button_id, 'n_clicks') for param in params[1:]],
-    [State('value-setter-store', 'data')]
+    [Input(metric_id(ALL, suffix_button_id), 'n_clicks')]
 )
-def update_piechart(*args):
-    stored_data = args[-1]
+def update_piechart(n_clicks):
+    sync_state_limits()
     values = []
     colors = []
     labels = []
     
     for param in params[1:]:
         try:
-            if param in stored_data:
-                ooc_list = stored_data[param]['ooc']
-                if ooc_list:
-                    ooc_param = (ooc_list[-1] * 100) + 1
-                    ooc_percentage = ooc_list[-1] * 100  # Calculate OOC percentage
-                else:
-                    ooc_param = 1
-                    ooc_percentage = 0
+            if param in state_dict:
+                ooc_rate = state_dict[param]['ooc_rate']
+                ooc_param = (ooc_rate * 100) + 1
+                ooc_percentage = ooc_rate * 100  # Calculate OOC percentage
             else:
                 ooc_param = 1
                 ooc_percentage = 0
@@ -1092,7 +2062,8 @@ def update_piechart(*args):
     }
 
 # Add this callback to sync visible inputs with hidden numeric inputs
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='spc_ui', function_name='numeric_inputs'),
     [Output('ud_usl_input', 'value'),
      Output('ud_lsl_input', 'value'),
      Output('ud_ucl_input', 'value'),
@@ -1101,28 +2072,38 @@ def update_piechart(*args):
      Input('ud_lsl_input', 'value'),
      Input('ud_ucl_input', 'value'),
      Input('ud_lcl_input', 'value'),
-     Input('metric-select-dropdown', 'value')],
+     Input('metric-select-dropdown', 'value'),
+     Input('what-if-graph', 'clickData')],
     [State('value-setter-store', 'data')]
 )
-def update_numeric_inputs(panel_usl, panel_lsl, panel_ucl, panel_lcl, dd_select, stored_data):
-    ctx = callback_context
-    if not ctx.triggered:
-        return no_update, no_update, no_update, no_update
-    
-    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    
-    # If triggered by panel inputs, return those values
-    if trigger_id in ['ud_usl_input', 'ud_lsl_input', 'ud_ucl_input', 'ud_lcl_input']:
-        return panel_usl, panel_lsl, panel_ucl, panel_lcl
-    
-    # If triggered by dropdown, return stored values for selected metric
-    elif trigger_id == 'metric-select-dropdown' and dd_select in stored_data:
-        return (stored_data[dd_select]['usl'],
-                stored_data[dd_select]['lsl'],
-                stored_data[dd_select]['ucl'],
-                stored_data[dd_select]['lcl'])
-    
-    return no_update, no_update, no_update, no_update
+
+# Live updates pushed over /api/stream, applied entirely in the browser (assets/spc_push.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='spc_push', function_name='drain'),
+    Output('push-store', 'data'),
+    [Input('push-poll', 'n_intervals')]
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='spc_push', function_name='banner'),
+    [Output('alert-banner', 'children'),
+     Output('alert-banner', 'style')],
+    [Input('push-store', 'data')],
+    prevent_initial_call=True
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='spc_push', function_name='row'),
+    [Output(metric_id(MATCH, suffix_count), 'children', allow_duplicate=True),
+     Output(metric_id(MATCH, suffix_sparkline_graph), sparkline_prop, allow_duplicate=True),
+     Output(metric_id(MATCH, suffix_ooc_n), 'children', allow_duplicate=True),
+     Output(metric_id(MATCH, suffix_ooc_g), 'value', allow_duplicate=True),
+     Output(metric_id(MATCH, suffix_indicator), 'color', allow_duplicate=True)],
+    [Input('push-store', 'data')],
+    [State(metric_id(MATCH, suffix_button_id), 'id')],
+    prevent_initial_call=True
+)
+
 
 # Add callback for AI chat
 @app.callback(
@@ -1138,29 +2119,62 @@ def update_ai_response(n_clicks, question):
     return ""
 
 # Move app.layout here, after all helper functions are defined
-app.layout = html.Div(
-    children=[
-        build_banner(),
-        build_tabs(),
-        # Main app
-        html.Div(
-            id='app-content',
-            className='container scalable',
-            children=html.Div([  # Add initial content for tab2
-                build_top_panel(),
-                build_chart_panel()
-            ])
-        ),
-        html.Button('Proceed to Measurement', id='tab-trigger-btn', n_clicks=0,
-                    style={'display': 'none'}),  # Hide button initially
-        dcc.Store(
-            id='value-setter-store',
-            data=init_value_setter_store(),
-            storage_type='memory'
-        ),
-        generate_modal(),
-    ]
-)
+# Served as a function so every page load picks up the latest saved limits
+def serve_layout():
+    return html.Div(
+        children=[
+            build_banner(),
+            build_alert_banner(),
+            dcc.Interval(id='push-poll', interval=1000),
+            dcc.Store(id='push-store', storage_type='memory'),
+            build_tabs(),
+            # Main app
+            html.Div(
+                id='app-content',
+                className='container scalable',
+                children=[
+                    html.Div(id='tab1-content', style={'display': 'none'}, children=build_tab_1()),
+                    html.Div(id='tab2-content', style={'display': 'block'}, children=[
+                        build_top_panel(),
+                        build_chart_panel(),
+                        build_multivariate_panel()
+                    ]),
+                    html.Div(id='tab3-content', style={'display': 'none'},
+                             children=build_plant_panel() if plant_monitor else [])
+                ]
+            ),
+            html.Button('Proceed to Measurement', id='tab-trigger-btn', n_clicks=0,
+                        style={'display': 'none'}),  # Hide button initially
+            dcc.Store(
+                id='value-setter-store',
+                data=init_value_setter_store(),
+                storage_type='memory'
+            ),
+            generate_modal(),
+        ]
+    )
+
+
+app.layout = serve_layout
+
+# Admin-only memory diagnostics, mounted only when SPC_ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv('SPC_ADMIN_TOKEN')
+if ADMIN_TOKEN:
+    server.register_blueprint(create_diagnostics_blueprint(ADMIN_TOKEN, {
+        'history': lambda: history,
+        'df': lambda: df,
+        'archive': lambda: archive,
+        'df_full': lambda: df_full,
+        'state_dict': lambda: state_dict,
+        'default_limits': lambda: default_limits,
+        'correlation_state': lambda: correlation_state,
+        't2_chart': lambda: t2_chart,
+        'what_if_sorted_history': lambda: sorted_history,
+        'push_channel': lambda: push_channel,
+        'alert_worker': lambda: alert_worker,
+        'layout': serve_layout
+    }))
+
 # Running the server
 if __name__ == '__main__':
     app.run_server(debug=True, port=8050)
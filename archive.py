@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+from spc_stats import RunningStats, downsample_minmax, ooc_mask
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+
+def iter_csv_chunks(path, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS, nrows=None):
+    """DataFrames of at most chunk_rows rows read in turn from a CSV"""
+    yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows, nrows=nrows)
+
+
+class DisplaySeries:
+    """Min/max downsampled (x, y) series that stays under max_points as it grows.
+
+    New points are reduced to the density the series already has before being
+    appended, and the whole series is halved when it overflows, so every part
+    of the history is drawn at about the same resolution.
+    """
+
+    def __init__(self, max_points=2000):
+        self.max_points = max(max_points, 4)
+        self.n_rows = 0
+        self.x = np.empty(0)
+        self.y = np.empty(0, dtype=float)
+
+    def extend(self, x, y):
+        n = len(y)
+        if not n:
+            return
+        keep = n if not self.n_rows else round(n * len(self.y) / self.n_rows)
+        x, y = downsample_minmax(x, y, min(max(keep, 4), self.max_points))
+        self.x = np.concatenate([self.x, x]) if len(self.x) else x
+        self.y = np.concatenate([self.y, y])
+        self.n_rows += n
+        if len(self.y) > self.max_points:
+            self.x, self.y = downsample_minmax(self.x, self.y, self.max_points // 2)
+
+
+class HistoryArchive:
+    """Leading rows of a CSV history kept as summaries instead of arrays.
+
+    load() streams the file in chunks and keeps only its last tail_rows rows as
+    a DataFrame, which the app holds in memory as usual. Every row before the
+    tail is folded into per-parameter accumulators that merge exactly across
+    chunks: RunningStats (count, mean, variance, min, max) and a bounded
+    DisplaySeries. OOC counts depend on the limits in force, so they are
+    counted by a chunked rescan of the archived rows and cached per limit
+    pair. Peak memory is about tail_rows + chunk_rows rows of the file.
+
+    An archive with no rows (n_rows == 0) stands in when the whole history is
+    loaded into memory, so callers do not need a separate code path.
+    """
+
+    def __init__(self, params, path=None, chunk_rows=DEFAULT_CHUNK_ROWS, max_points=2000, x_column='Batch'):
+        self.params = list(params)
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.x_column = x_column
+        self.n_rows = 0
+        self.x_max = None
+        self.stats = {param: RunningStats() for param in self.params}
+        self.display = {param: DisplaySeries(max_points) for param in self.params}
+        self._ooc_counts = {}
+
+    @classmethod
+    def load(cls, path, tail_rows, chunk_rows=DEFAULT_CHUNK_ROWS, max_points=2000, x_column='Batch', exclude=()):
+        """Stream path, returning the archive of all but the last tail_rows rows and those rows.
+
+        Columns in exclude (a timestamp, say) are kept in the tail but not summarised.
+        """
+        archive = None
+        tail = []
+        n_tail = 0
+        for chunk in iter_csv_chunks(path, chunk_rows=chunk_rows):
+            if archive is None:
+                params = [col for col in chunk if col != x_column and col not in exclude]
+                archive = cls(params, path, chunk_rows, max_points, x_column)
+            tail.append(chunk)
+            n_tail += len(chunk)
+            # Fold whatever no longer fits in the tail into the accumulators
+            while tail and n_tail - len(tail[0]) >= tail_rows:
+                n_tail -= len(tail[0])
+                archive.fold(tail.pop(0))
+            if n_tail > tail_rows:
+                split = n_tail - tail_rows
+                archive.fold(tail[0].iloc[:split])
+                tail[0] = tail[0].iloc[split:]
+                n_tail = tail_rows
+
+        if archive is None:
+            raise ValueError(f"{path} has no rows")
+        frame = pd.concat(tail, ignore_index=True) if tail else pd.DataFrame(columns=[x_column, *archive.params])
+        return archive, frame
+
+    def fold(self, frame):
+        """Add the rows of frame, which must directly follow the rows already archived"""
+        x = frame[self.x_column].to_numpy()
+        for param in self.params:
+            values = frame[param].to_numpy(dtype=float)
+            self.stats[param].update(values)
+            self.display[param].extend(x, values)
+        self.n_rows += len(frame)
+        if len(x):
+            self.x_max = float(np.nanmax(x)) if self.x_max is None else max(self.x_max, float(np.nanmax(x)))
+        self._ooc_counts.clear()
+
+    def fill_histograms(self, histograms):
+        """Add the archived rows to {param: FixedHistogram}, one chunked rescan for all of them"""
+        if not self.n_rows or not histograms:
+            return
+        for chunk in iter_csv_chunks(self.path, list(histograms), self.chunk_rows, nrows=self.n_rows):
+            for param, histogram in histograms.items():
+                histogram.update(chunk[param].to_numpy(dtype=float))
+
+    def ooc_counts(self, limits):
+        """OOC count over the archived rows per parameter, for limits {param: (ucl, lcl)}"""
+        missing = {
+            param: bounds for param, bounds in limits.items()
+            if (param, *bounds) not in self._ooc_counts
+        }
+        if missing and self.n_rows:
+            counts = dict.fromkeys(missing, 0)
+            for chunk in iter_csv_chunks(self.path, list(missing), self.chunk_rows, nrows=self.n_rows):
+                for param, (ucl, lcl) in missing.items():
+                    counts[param] += int(np.count_nonzero(ooc_mask(chunk[param].to_numpy(dtype=float), ucl, lcl)))
+            self._ooc_counts.update({(param, *missing[param]): count for param, count in counts.items()})
+        return {
+            param: self._ooc_counts.get((param, *bounds), 0)
+            for param, bounds in limits.items()
+        }
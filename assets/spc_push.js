@@ -0,0 +1,140 @@
+/* Server-sent event client for live metric updates.
+ *
+ * The EventSource buffers deltas and alerts between ticks of the client-only
+ * push-poll interval; the clientside callbacks below drain that buffer into
+ * push-store and from there into the metric rows and the alert banner, so
+ * live updates never cost a callback round trip to the server. While the
+ * server refuses a stream (too many open on that worker) the same deltas are
+ * polled from /api/stream/poll, and the stream is retried after a pause.
+ */
+(function() {
+    var deltas = {};
+    var alerts = [];
+    var alertsChanged = false;
+    var source = null;
+    var retryAt = 0;
+    var polling = false;
+    var pollCursor = null;
+    var pollAt = 0;
+    var pollInFlight = false;
+
+    function addDelta(delta) {
+        var previous = deltas[delta.param];
+        if (previous) {
+            delta.x = previous.x.concat(delta.x);
+            delta.y = previous.y.concat(delta.y);
+        }
+        deltas[delta.param] = delta;
+    }
+
+    function poll() {
+        if (!polling || pollInFlight || Date.now() < pollAt) {
+            return;
+        }
+        pollInFlight = true;
+        pollAt = Date.now() + 5000;
+        fetch('/api/stream/poll' + (pollCursor === null ? '' : '?since=' + pollCursor))
+            .then(function(response) {
+                return response.ok ? response.json() : null;
+            })
+            .then(function(data) {
+                if (data && polling) {
+                    pollCursor = data.cursor;
+                    data.deltas.forEach(addDelta);
+                }
+            })
+            .catch(function() {})
+            .then(function() {
+                pollInFlight = false;
+            });
+    }
+
+    function connect() {
+        if (source || typeof EventSource === 'undefined' || Date.now() < retryAt) {
+            return;
+        }
+        source = new EventSource('/api/stream');
+        source.onopen = function() {
+            polling = false;
+            pollCursor = null;
+        };
+        source.onerror = function() {
+            // Dropped connections are retried by the browser; a refused one closes for good
+            if (source.readyState === EventSource.CLOSED) {
+                source = null;
+                retryAt = Date.now() + 30000;
+                polling = true;
+            }
+        };
+        source.addEventListener('delta', function(e) {
+            addDelta(JSON.parse(e.data));
+        });
+        source.addEventListener('alert', function(e) {
+            alerts.unshift(JSON.parse(e.data));
+            alerts = alerts.slice(0, 3);
+            alertsChanged = true;
+        });
+        source.addEventListener('resync', function() {
+            // Deltas were dropped while this tab was stalled, start from a fresh layout
+            window.location.reload();
+        });
+    }
+
+    var noUpdate = function() {
+        return window.dash_clientside.no_update;
+    };
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        spc_push: {
+            drain: function(n_intervals) {
+                connect();
+                poll();
+                if (!Object.keys(deltas).length && !alertsChanged) {
+                    return noUpdate();
+                }
+                var out = {deltas: deltas, alerts: alertsChanged ? alerts : null, seq: n_intervals};
+                deltas = {};
+                alertsChanged = false;
+                return out;
+            },
+
+            row: function(data, buttonId) {
+                var delta = data && data.deltas[buttonId.index];
+                if (!delta) {
+                    return [noUpdate(), noUpdate(), noUpdate(), noUpdate(), noUpdate()];
+                }
+                return [
+                    String(delta.count),
+                    // Compact mode sends a re-rendered svg image instead of points
+                    delta.sparkline || {x: [delta.x], y: [delta.y]},
+                    delta.ooc_pct.toFixed(2) + '%',
+                    delta.ooc_pct + 0.00001,
+                    delta.color
+                ];
+            },
+
+            banner: function(data) {
+                if (!data || !data.alerts) {
+                    return [noUpdate(), noUpdate()];
+                }
+                var children = data.alerts.map(function(alert) {
+                    return {
+                        namespace: 'dash_html_components',
+                        type: 'Div',
+                        props: {
+                            children: alert.param + ': ' + alert.rules.join(', ').toUpperCase() +
+                                ' at batch ' + alert.batch + ' (value ' + Number(alert.value).toPrecision(4) +
+                                ', ' + alert.points + ' point(s))'
+                        }
+                    };
+                });
+                return [children, {
+                    display: 'block',
+                    backgroundColor: '#2d3038',
+                    color: '#FFD15F',
+                    padding: '5px 20px'
+                }];
+            }
+        }
+    });
+})();
@@ -0,0 +1,99 @@
+/* Clientside callbacks for UI state that never needs the server.
+ *
+ * Both tab panels stay mounted in app-content; switching tabs only toggles
+ * their visibility, so the metric rows, charts and Specification Settings
+ * inputs keep their state and no layout is rebuilt or sent over the wire.
+ * The modal, the limit inputs and the current-specs table are likewise
+ * driven from values the browser already holds in value-setter-store, and
+ * a click on the what-if curve fills the control limit inputs.
+ */
+(function() {
+    var SHOWN = {display: 'block'};
+    var HIDDEN = {display: 'none'};
+    var LIMITS = ['usl', 'lsl', 'ucl', 'lcl'];
+    var TABLE_STYLE = {
+        style_header: {backgroundColor: '#2d3038', color: '#95969A', fontWeight: 'bold'},
+        style_cell: {backgroundColor: '#2d3038', color: '#95969A', textAlign: 'left', padding: '10px'},
+        style_table: {overflowX: 'auto'}
+    };
+
+    var noUpdate = function() {
+        return window.dash_clientside.no_update;
+    };
+
+    function triggerId() {
+        var triggered = window.dash_clientside.callback_context.triggered;
+        return triggered.length ? triggered[0].prop_id.split('.')[0] : '';
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        spc_ui: {
+            render_tab: function(tab_switch, tab_value) {
+                var tab = tab_value;
+                if (triggerId() === 'tab-trigger-btn') {
+                    tab = tab_switch ? 'tab2' : 'tab1';
+                }
+                var specs = tab === 'tab1';
+                return [
+                    tab,
+                    specs ? SHOWN : HIDDEN,
+                    tab === 'tab2' ? SHOWN : HIDDEN,
+                    tab === 'tab3' ? SHOWN : HIDDEN,
+                    false,  // Specs-tab not disabled
+                    false,  // Control-chart-tab not disabled
+                    specs ? {display: 'inline-block', float: 'right'} : HIDDEN
+                ];
+            },
+
+            markdown_visibility: function(button_click, close_click) {
+                return triggerId() === 'learn-more-button' ? SHOWN : HIDDEN;
+            },
+
+            numeric_inputs: function(usl, lsl, ucl, lcl, dd_select, what_if_click, stored_data) {
+                var trigger = triggerId();
+                // Edits in the panel inputs are passed through as typed
+                if (trigger.indexOf('ud_') === 0) {
+                    return [usl, lsl, ucl, lcl];
+                }
+                // A point picked on the what-if curve proposes its control limits
+                if (trigger === 'what-if-graph' && what_if_click && what_if_click.points.length) {
+                    var limits = what_if_click.points[0].customdata;
+                    return [noUpdate(), noUpdate(), limits[0], limits[1]];
+                }
+                // A new metric loads its stored limits
+                if (trigger === 'metric-select-dropdown' && stored_data && stored_data[dd_select]) {
+                    return LIMITS.map(function(key) {
+                        return stored_data[dd_select][key];
+                    });
+                }
+                return LIMITS.map(noUpdate);
+            },
+
+            current_specs: function(view_clicks, stored_data, dd_select) {
+                if (triggerId() === 'value-setter-view-btn' && !view_clicks) {
+                    return '';
+                }
+                var data = stored_data && stored_data[dd_select];
+                if (!data) {
+                    return {namespace: 'dash_html_components', type: 'Div', props: {children: 'No data available'}};
+                }
+                return {
+                    namespace: 'dash_table',
+                    type: 'DataTable',
+                    props: Object.assign({
+                        data: [
+                            {'Limit Type': 'Upper Specification Limit (USL)', 'Value': data.usl},
+                            {'Limit Type': 'Lower Specification Limit (LSL)', 'Value': data.lsl},
+                            {'Limit Type': 'Upper Control Limit (UCL)', 'Value': data.ucl},
+                            {'Limit Type': 'Lower Control Limit (LCL)', 'Value': data.lcl}
+                        ],
+                        columns: [
+                            {name: 'Limit Type', id: 'Limit Type'},
+                            {name: 'Value', id: 'Value', type: 'numeric', format: {specifier: '.3f'}}
+                        ]
+                    }, TABLE_STYLE)
+                };
+            }
+        }
+    });
+})();
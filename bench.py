@@ -0,0 +1,406 @@
+"""Benchmarks for the SPC dashboard hot paths.
+
+Run one with `python bench.py <name>`, `python bench.py -h` lists them.
+"""
+import argparse
+import copy
+import json
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import plotly
+
+from column_store import ColumnStore
+from spc_stats import ooc_summary
+
+N_PARAMS = 7
+
+
+def best_of(fn, repeat):
+    """Best wall time of fn over repeat runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def wire_size(obj):
+    return len(json.dumps(obj, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+def legacy_limit_update(stored_data, metric, limits):
+    """Limit edit as it used to be done: deepcopy the store, rerun the OOC loop, return everything"""
+    new_data = copy.deepcopy(stored_data)
+    new_data[metric].update(limits)
+    data = new_data[metric]['data']
+    ooc_count = 0
+    ooc = []
+    for i in range(len(data)):
+        if data[i] >= new_data[metric]['ucl'] or data[i] <= new_data[metric]['lcl']:
+            ooc_count += 1
+        ooc.append(ooc_count / (i + 1))
+    new_data[metric]['ooc'] = ooc
+    return new_data
+
+
+def patch_limit_update(values, metric, limits):
+    """Limit edit as update_value_setter_store does it now: one vectorised pass, one Patch"""
+    from dash import Patch
+
+    ooc_count, ooc_rate = ooc_summary(values, limits['ucl'], limits['lcl'])
+    patch = Patch()
+    for key, value in limits.items():
+        patch[metric][key] = value
+    patch[metric]['ooc_count'] = ooc_count
+    patch[metric]['ooc_rate'] = ooc_rate
+    return patch.to_plotly_json()
+
+
+def bench_limit_update(args):
+    rng = np.random.default_rng(0)
+    limits = {'usl': 3.0, 'lsl': -3.0, 'ucl': 2.0, 'lcl': -2.0}
+    print(f"{'rows':>10} {'legacy ms':>10} {'patch ms':>10} {'legacy bytes':>14} {'patch bytes':>12}")
+    for n in args.sizes:
+        columns = {f'p{i}': rng.standard_normal(n) for i in range(N_PARAMS)}
+        stored_data = {
+            name: {'data': values.tolist(), 'ooc': [0.0] * n, **limits}
+            for name, values in columns.items()
+        }
+        metric = 'p0'
+
+        legacy_ms = best_of(lambda: legacy_limit_update(stored_data, metric, limits), args.repeat)
+        patch_ms = best_of(lambda: patch_limit_update(columns[metric], metric, limits), args.repeat)
+        # The legacy callback also uploaded the whole store as State
+        legacy_bytes = 2 * wire_size(legacy_limit_update(stored_data, metric, limits))
+        patch_bytes = wire_size(patch_limit_update(columns[metric], metric, limits))
+        print(f"{n:>10} {legacy_ms:>10.2f} {patch_ms:>10.2f} {legacy_bytes:>14} {patch_bytes:>12}")
+
+
+def synthetic_store(n_rows, n_params, seed=0):
+    rng = np.random.default_rng(seed)
+    store = ColumnStore(['Batch'] + [f'p{i}' for i in range(n_params)], dtypes={'Batch': np.int64})
+    store.append({'Batch': np.arange(1, n_rows + 1),
+                  **{f'p{i}': rng.standard_normal(n_rows) for i in range(n_params)}})
+    return store
+
+
+def bench_export(args):
+    from export import iter_csv, iter_parquet, iter_violation_frames, parquet_available
+
+    store = synthetic_store(args.rows, args.params)
+    params = store.columns[1:]
+    limits = {p: {'mean': 0.0, 'ucl': 2.0, 'lcl': -2.0, 'usl': 3.0, 'lsl': -3.0} for p in params}
+    writers = {'csv': iter_csv}
+    if parquet_available():
+        writers['parquet'] = iter_parquet
+
+    print(f"{args.rows} rows x {args.params} parameters, chunk {args.chunk_rows} rows")
+    for name, writer in writers.items():
+        def run():
+            return sum(len(part) for part in writer(
+                iter_violation_frames(store, params, limits, chunk_rows=args.chunk_rows)))
+
+        start = time.perf_counter()
+        n_bytes = run()
+        elapsed = time.perf_counter() - start
+        # Separate pass for memory, tracemalloc slows allocation-heavy code severalfold
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:>8}: {args.rows / elapsed:>12,.0f} rows/s  {n_bytes / elapsed / 1e6:>8.1f} MB/s  "
+              f"{n_bytes / 1e6:>8.1f} MB out  peak {peak / 1e6:.1f} MB")
+
+
+def bench_push(args):
+    """CPU cost of the SSE fan-out: one producer, N in-process clients draining their streams"""
+    from push import PushChannel
+
+    rng = np.random.default_rng(0)
+    params = [f'p{i}' for i in range(N_PARAMS)]
+
+    def build_deltas(start, stop):
+        return {p: {'param': p, 'count': stop, 'ooc_pct': 1.0, 'color': '#007439',
+                    'x': list(range(start, stop)), 'y': rng.standard_normal(stop - start).tolist()}
+                for p in params}
+
+    print(f"{'clients':>8} {'events':>8} {'cpu ms':>10} {'cpu us/event/client':>22}")
+    for n_clients in args.clients:
+        channel = PushChannel(build_deltas, queue_size=args.events * N_PARAMS + 16)
+
+        def client():
+            for message in channel.stream(params):
+                if message.startswith('event: done'):
+                    break
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(n_clients)]
+        for thread in threads:
+            thread.start()
+        while channel.subscriber_count() < n_clients:
+            time.sleep(0.01)
+
+        # Same work as the producer thread, driven inline so every batch is its own event
+        cpu_start = time.process_time()
+        for i in range(args.events):
+            for topic, payload in build_deltas(i * 10, i * 10 + 10).items():
+                channel.publish('delta', payload, topic=topic)
+            time.sleep(args.interval)
+        channel.publish('done', {})
+        for thread in threads:
+            thread.join()
+        cpu_ms = (time.process_time() - cpu_start) * 1000
+        print(f"{n_clients:>8} {args.events:>8} {cpu_ms:>10.1f} "
+              f"{cpu_ms * 1000 / (args.events * n_clients):>22.1f}")
+
+
+def bench_sparklines(args):
+    """Layout payload and build time of the metric-row sparklines, per-row graphs against svg"""
+    from sparklines import sparkline_figure, sparkline_svg_uri
+
+    rng = np.random.default_rng(0)
+    x = np.arange(args.rows)
+    print(f"{args.rows} batches per parameter")
+    print(f"{'params':>7} {'graph KB':>10} {'graph ms':>10} {'svg KB':>8} {'svg ms':>8} {'plotly instances':>17}")
+    for n_params in args.params:
+        columns = [rng.standard_normal(args.rows) for _ in range(n_params)]
+
+        start = time.perf_counter()
+        graph_bytes = sum(wire_size(sparkline_figure(x.tolist(), y.tolist(), 'p')) for y in columns)
+        graph_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        svg_bytes = sum(len(sparkline_svg_uri(y)) for y in columns)
+        svg_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{n_params:>7} {graph_bytes / 1024:>10.0f} {graph_ms:>10.1f} {svg_bytes / 1024:>8.0f} "
+              f"{svg_ms:>8.1f} {n_params:>10} -> 0")
+
+
+# Scripted Specification Settings session: (step, props the user changes)
+SPEC_SESSION = [
+    ('open AI assistant', ['learn-more-button.n_clicks']),
+    ('close AI assistant', ['markdown_close.n_clicks']),
+    ('open Specification Settings', ['app-tabs.value']),
+    ('select metric', ['metric-select-dropdown.value']),
+    ('view current setup', ['value-setter-view-btn.n_clicks']),
+    ('edit USL', ['ud_usl_input.value']),
+    ('edit LSL', ['ud_lsl_input.value']),
+    ('edit UCL', ['ud_ucl_input.value']),
+    ('edit LCL', ['ud_lcl_input.value']),
+    ('update limits', ['value-setter-set-btn.n_clicks']),
+    ('select another metric', ['metric-select-dropdown.value']),
+    ('back to dashboard', ['app-tabs.value']),
+]
+
+
+def layout_props(node, props):
+    """Flatten a serialised layout into {'id.prop': value} for components with string ids"""
+    if isinstance(node, list):
+        for child in node:
+            layout_props(child, props)
+    elif isinstance(node, dict) and 'props' in node:
+        component_id = node['props'].get('id')
+        for prop, value in node['props'].items():
+            if isinstance(component_id, str):
+                props[f"{component_id}.{prop}"] = value
+            layout_props(value, props)
+    return props
+
+
+def callback_outputs(dependency):
+    output = dependency['output']
+    outputs = output[2:-2].split('...') if output.startswith('..') else [output]
+    return {out.split('@')[0] for out in outputs}
+
+
+def bench_spec_session(args):
+    """Server requests and upload a scripted Specification Settings session causes"""
+    from app import server
+
+    client = server.test_client()
+    dependencies = client.get('/_dash-dependencies').get_json()
+    props = layout_props(client.get('/_dash-layout').get_json(), {})
+
+    print(f"{'step':<30} {'server':>7} {'client':>7} {'upload KB':>10}")
+    totals = [0, 0, 0]
+    for step, changed in SPEC_SESSION:
+        # Follow the chain of callbacks the change sets off, each firing once per step
+        fired, changed = set(), set(changed)
+        n_server = n_client = upload = 0
+        while changed:
+            triggered = set()
+            for i, dependency in enumerate(dependencies):
+                inputs = {f"{dep['id']}.{dep['property']}" for dep in dependency['inputs']}
+                if i not in fired and inputs & changed:
+                    fired.add(i)
+                    triggered |= callback_outputs(dependency)
+                    if dependency['clientside_function'] is None:
+                        n_server += 1
+                        values = [props.get(f"{dep['id']}.{dep['property']}")
+                                  for dep in dependency['inputs'] + dependency['state']]
+                        upload += len(json.dumps(values))
+                    else:
+                        n_client += 1
+            changed = triggered
+        print(f"{step:<30} {n_server:>7} {n_client:>7} {upload / 1024:>10.1f}")
+        totals = [totals[0] + n_server, totals[1] + n_client, totals[2] + upload]
+    print(f"{'total':<30} {totals[0]:>7} {totals[1]:>7} {totals[2] / 1024:>10.1f}")
+
+
+def write_synthetic_csv(path, n_rows, n_params, chunk_rows=500_000, seed=0):
+    """History CSV in the layout of data/spc_data.csv, written chunk by chunk"""
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        frame = pd.DataFrame({'Batch': np.arange(start + 1, stop + 1)})
+        for i in range(n_params):
+            frame[f'p{i}'] = np.round(rng.normal(10.0, 1.0, stop - start), 4)
+        frame.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+def load_history(path, mode, tail_rows, chunk_rows):
+    """Load path the way the app does in the given SPC_HISTORY_MODE; runs in a fresh process"""
+    import resource
+
+    import pandas as pd
+    from archive import HistoryArchive
+    from spc_stats import RunningStats
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    if mode == 'chunked':
+        archive, frame = HistoryArchive.load(path, tail_rows, chunk_rows)
+    else:
+        frame = pd.read_csv(path)
+        archive = HistoryArchive(list(frame)[1:])
+    store = ColumnStore.from_frame(frame)
+    limits = {}
+    for param in archive.params:
+        stats = RunningStats()
+        stats.merge(archive.stats[param])
+        stats.update(store.column(param))
+        limits[param] = (stats.mean + 2 * stats.std, stats.mean - 2 * stats.std)
+        ooc_summary(store.column(param), *limits[param])
+    archive.ooc_counts(limits)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'rows': archive.n_rows + len(store),
+        'seconds': seconds,
+        'peak_mb': peak / 2 ** 20,
+        'maxrss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+
+def bench_chunked_load(args):
+    """Startup time and peak memory of loading a large history fully against in chunks"""
+    import multiprocessing
+    import os
+    import sys
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.csv
+        if path is None:
+            path = os.path.join(tmp, 'history.csv')
+            write_synthetic_csv(path, args.rows, args.params)
+        print(f"{path}: {os.path.getsize(path) / 2 ** 20:.0f} MB, "
+              f"tail {args.tail_rows} rows, chunks of {args.chunk_rows} rows")
+        print(f"{'mode':>8} {'rows':>10} {'seconds':>8} {'traced peak MB':>15} {'max RSS MB':>11}")
+
+        results = {}
+        for mode in args.modes:
+            # A fresh process per mode so one load's peak cannot hide in the other's
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                result = pool.submit(load_history, path, mode, args.tail_rows, args.chunk_rows).result()
+            results[mode] = result
+            print(f"{mode:>8} {result['rows']:>10} {result['seconds']:>8.2f} "
+                  f"{result['peak_mb']:>15.1f} {result['maxrss_mb']:>11.0f}")
+
+    if 'chunked' in results:
+        peak = results['chunked']['peak_mb']
+        ok = peak <= args.budget_mb
+        print(f"chunked peak {peak:.1f} MB against a budget of {args.budget_mb} MB: {'ok' if ok else 'FAILED'}")
+        if not ok:
+            sys.exit(1)
+
+
+def bench_dtypes(args):
+    """Bytes per column of the history store with default and compact dtypes"""
+    import pandas as pd
+    from column_store import ColumnStore, compact_dtypes, measured_resolution
+
+    frame = pd.read_csv(args.csv)
+    default = ColumnStore.from_frame(frame)
+    compact = ColumnStore.from_frame(frame, compact_dtypes(frame))
+    default_bytes, compact_bytes = default.nbytes(), compact.nbytes()
+
+    print(f"{args.csv}: {len(frame)} rows")
+    print(f"{'column':<16} {'dtype':>8} {'compact':>8} {'resolution':>11} {'max error':>10} {'bytes':>10} {'compact':>10}")
+    for col in frame:
+        values = default.column(col).astype(float)
+        error = np.nanmax(np.abs(compact.column(col).astype(float) - values)) if len(values) else 0.0
+        print(f"{col:<16} {str(default.column(col).dtype):>8} {str(compact.column(col).dtype):>8} "
+              f"{measured_resolution(values):>11.4g} {error:>10.3g} {default_bytes[col]:>10} {compact_bytes[col]:>10}")
+    total, compact_total = sum(default_bytes.values()), sum(compact_bytes.values())
+    print(f"{'total':<16} {'':>8} {'':>8} {'':>11} {'':>10} {total:>10} {compact_total:>10} "
+          f"({compact_total / total:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='name', required=True)
+
+    sub = subparsers.add_parser('limit-update', help='limit edit latency against history length')
+    sub.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    sub.add_argument('--repeat', type=int, default=3)
+    sub.set_defaults(func=bench_limit_update)
+
+    sub = subparsers.add_parser('export', help='violation export throughput and peak memory')
+    sub.add_argument('--rows', type=int, default=1_000_000)
+    sub.add_argument('--params', type=int, default=7)
+    sub.add_argument('--chunk-rows', type=int, default=65536)
+    sub.set_defaults(func=bench_export)
+
+    sub = subparsers.add_parser('push', help='server CPU per connected SSE client')
+    sub.add_argument('--clients', type=int, nargs='+', default=[1, 10, 100, 500])
+    sub.add_argument('--events', type=int, default=50)
+    sub.add_argument('--interval', type=float, default=0.01)
+    sub.set_defaults(func=bench_push)
+
+    sub = subparsers.add_parser('sparklines', help='metric row sparkline payload against parameter count')
+    sub.add_argument('--rows', type=int, default=10000)
+    sub.add_argument('--params', type=int, nargs='+', default=[7, 27, 100, 300])
+    sub.set_defaults(func=bench_sparklines)
+
+    sub = subparsers.add_parser('spec-session', help='server requests sent by a scripted Specification Settings session')
+    sub.set_defaults(func=bench_spec_session)
+
+    sub = subparsers.add_parser('chunked-load', help='history load time and peak memory, full against chunked')
+    sub.add_argument('--csv', help='history file to load, a synthetic one is written when omitted')
+    sub.add_argument('--rows', type=int, default=2_000_000)
+    sub.add_argument('--params', type=int, default=N_PARAMS)
+    sub.add_argument('--tail-rows', type=int, default=10000)
+    sub.add_argument('--chunk-rows', type=int, default=100000)
+    sub.add_argument('--budget-mb', type=float, default=64, help='fail when the chunked load peaks above this')
+    sub.add_argument('--modes', nargs='+', default=['memory', 'chunked'])
+    sub.set_defaults(func=bench_chunked_load)
+
+    sub = subparsers.add_parser('dtypes', help='history store bytes per column, default against compact dtypes')
+    sub.add_argument('--csv', default='data/spc_data.csv')
+    sub.set_defaults(func=bench_dtypes)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
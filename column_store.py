@@ -0,0 +1,229 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from spc_stats import GrowableArray
+
+INT32 = np.iinfo(np.int32)
+
+
+def measured_resolution(values):
+    """Smallest step between distinct finite values of a column, 0.0 with fewer than two"""
+    values = np.asarray(values, dtype=float)
+    distinct = np.unique(values[np.isfinite(values)])
+    return float(np.diff(distinct).min()) if len(distinct) > 1 else 0.0
+
+
+def compact_dtype(values, int_headroom=4):
+    """int32 or float32 when the column fits it without losing its measured resolution, else its own dtype.
+
+    Integer columns need to stay within 1/int_headroom of the int32 range so
+    ids keep growing as batches arrive. Float columns need their float32
+    rounding error to stay under a tenth of the smallest step between values.
+    """
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.integer):
+        if not len(values) or (values.min() >= INT32.min // int_headroom and values.max() <= INT32.max // int_headroom):
+            return np.dtype(np.int32)
+    elif np.issubdtype(values.dtype, np.floating):
+        finite = values[np.isfinite(values)]
+        with np.errstate(over='ignore'):
+            error = float(np.abs(finite.astype(np.float32).astype(float) - finite).max()) if len(finite) else 0.0
+        if error == 0.0 or error <= measured_resolution(finite) / 10:
+            return np.dtype(np.float32)
+    return values.dtype
+
+
+def display_decimals(values, dtype):
+    """Decimals that show a float32 column as it was measured rather than with float32 noise"""
+    if dtype != np.float32:
+        return None
+    resolution = measured_resolution(values)
+    return max(int(np.ceil(-np.log10(resolution))) + 2, 0) if resolution else None
+
+
+def compact_dtypes(frame):
+    return {col: compact_dtype(frame[col].to_numpy()) for col in frame}
+
+
+def to_epoch_seconds(values):
+    """ISO 8601 timestamps as float seconds since the epoch (UTC), numbers passed through as already converted"""
+    values = pd.Series(values)
+    numeric = pd.to_numeric(values, errors='coerce')
+    if numeric.notna().sum() == values.notna().sum():
+        return numeric.to_numpy(dtype=float)
+    stamps = pd.to_datetime(values, utc=True, format='ISO8601')
+    return ((stamps - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1)).to_numpy(dtype=float)
+
+
+class SortedIndex:
+    """Sorted keys of one store column with the row each key came from.
+
+    Keys that arrive in order (batch ids, timestamps) are appended as they
+    are and the row of the i-th key is i, so no row array is kept. The first
+    out-of-order append merges the new keys in with searchsorted and starts
+    keeping rows, which costs one O(n) copy per such append. Readers take
+    the arrays as they were when they looked, as with the store columns.
+    """
+
+    def __init__(self, dtype=float):
+        # (keys, rows) swapped as one so a reader never pairs merged keys with identity rows
+        self._state = (GrowableArray(dtype=dtype), None)
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def extend(self, keys, start):
+        """Index keys for rows start, start + 1, ... which must directly follow the indexed rows"""
+        indexed_keys, indexed_rows = self._state
+        indexed = indexed_keys.view()
+        keys = np.asarray(keys, dtype=indexed.dtype)
+        if not len(keys):
+            return
+        rows = np.arange(start, start + len(keys))
+        if (not len(indexed) or keys[0] >= indexed[-1]) and not (np.diff(keys) < 0).any():
+            if indexed_rows is not None:
+                indexed_rows.extend(rows)
+            indexed_keys.extend(keys)
+            return
+
+        order = np.argsort(keys, kind='stable')
+        keys, rows = keys[order], rows[order]
+        at = np.searchsorted(indexed, keys, side='right')
+        merged_keys = GrowableArray(dtype=indexed.dtype, capacity=len(indexed) + len(keys))
+        merged_rows = GrowableArray(dtype=np.int64, capacity=len(indexed) + len(keys))
+        merged_keys.extend(np.insert(indexed, at, keys))
+        merged_rows.extend(np.insert(
+            np.arange(len(indexed)) if indexed_rows is None else indexed_rows.view(), at, rows
+        ))
+        self._state = (merged_keys, merged_rows)
+
+    def rows_between(self, low=None, high=None):
+        """Rows with low <= key <= high, as a slice while keys are in row order, else sorted row numbers"""
+        keys, rows = self._state
+        keys = keys.view()
+        first = 0 if low is None else int(np.searchsorted(keys, low, side='left'))
+        stop = len(keys) if high is None else int(np.searchsorted(keys, high, side='right'))
+        if rows is None:
+            return slice(first, max(first, stop))
+        return np.sort(rows.view()[first:stop])
+
+    def bounds(self):
+        """(smallest, largest) key, or None while nothing is indexed"""
+        keys = self._state[0].view()
+        return (keys[0].item(), keys[-1].item()) if len(keys) else None
+
+    def contains(self, keys):
+        """Mask of the keys that are already indexed"""
+        keys = np.asarray(keys)
+        indexed = self._state[0].view()
+        if not len(indexed):
+            return np.zeros(len(keys), dtype=bool)
+        at = np.minimum(np.searchsorted(indexed, keys, side='left'), len(indexed) - 1)
+        return indexed[at] == keys
+
+    def find(self, key):
+        """Row of the last row with this key, or None"""
+        keys, rows = self._state
+        keys = keys.view()
+        at = int(np.searchsorted(keys, key, side='right')) - 1
+        if at < 0 or keys[at] != key:
+            return None
+        return at if rows is None else int(rows.view()[at])
+
+
+class ColumnStore:
+    """Append-only batch history held as one growable numpy array per column.
+
+    Readers get views of the committed rows; a view stays valid after later
+    appends because growing reallocates rather than resizing in place.
+    append() is serialised by the store lock, and callers that need to update
+    derived state in the same commit can hold `store.lock` around both.
+    Columns named in index_columns also get a SortedIndex for range and key
+    lookups in O(log n).
+    """
+
+    def __init__(self, columns, dtypes=None, decimals=None, index_columns=()):
+        dtypes = dtypes or {}
+        self.columns = list(columns)
+        self.decimals = decimals or {}
+        self.lock = threading.RLock()
+        self.version = 0
+        self._length = 0
+        self._arrays = {
+            col: GrowableArray(dtype=dtypes.get(col, float))
+            for col in self.columns
+        }
+        self.indexes = {col: SortedIndex(dtypes.get(col, float)) for col in index_columns}
+
+    @classmethod
+    def from_frame(cls, frame, dtypes=None, index_columns=()):
+        """Store holding a copy of frame, its columns converted to dtypes where given"""
+        dtypes = {col: (dtypes or {}).get(col, frame[col].dtype) for col in frame}
+        decimals = {col: display_decimals(frame[col].to_numpy(), dtypes[col]) for col in frame}
+        store = cls(list(frame), dtypes=dtypes, decimals=decimals, index_columns=index_columns)
+        store.append({col: frame[col].to_numpy() for col in frame})
+        return store
+
+    def __len__(self):
+        return self._length
+
+    def append(self, columns):
+        """Append equal-length arrays for every column; returns the (start, stop) row range"""
+        missing = set(self.columns) - set(columns)
+        extra = set(columns) - set(self.columns)
+        if missing or extra:
+            raise ValueError(f"Column mismatch, missing: {sorted(missing)}, unexpected: {sorted(extra)}")
+        lengths = {len(columns[col]) for col in self.columns}
+        if len(lengths) != 1:
+            raise ValueError("All columns must have the same number of rows")
+
+        with self.lock:
+            start = len(self)
+            for col in self.columns:
+                self._arrays[col].extend(columns[col])
+            # Rows become visible to lock-free readers only once every column has them
+            self._length = len(self._arrays[self.columns[0]])
+            # Indexed after the rows are visible, so a lookup never returns a row past len(self)
+            for col, index in self.indexes.items():
+                index.extend(self.column(col, start), start)
+            self.version += 1
+            return start, len(self)
+
+    def column(self, name, start=0, stop=None):
+        return self._arrays[name].view()[:self._length][start:stop]
+
+    def tolist(self, name, start=0, stop=None):
+        """Column values as Python numbers for JSON payloads, float32 columns rounded to their resolution"""
+        values = self.column(name, start, stop)
+        if self.decimals.get(name) is not None:
+            return values.astype(float).round(self.decimals[name]).tolist()
+        return values.tolist()
+
+    def rows_between(self, name, low=None, high=None):
+        """Rows whose indexed column `name` lies in [low, high], a slice or sorted row numbers"""
+        return self.indexes[name].rows_between(low, high)
+
+    def find(self, name, key):
+        return self.indexes[name].find(key)
+
+    def contains(self, name, keys):
+        return self.indexes[name].contains(keys)
+
+    def row(self, position):
+        """Every column's value at one row, as Python numbers"""
+        return {col: self._arrays[col].view()[position].item() for col in self.columns}
+
+    def nbytes(self):
+        """Bytes allocated per column"""
+        return {col: array.nbytes for col, array in self._arrays.items()}
+
+    def frame(self, start=0, stop=None, columns=None):
+        """DataFrame over a row range, built from views without copying the columns"""
+        columns = columns or self.columns
+        stop = len(self) if stop is None else stop
+        return pd.DataFrame(
+            {col: self.column(col, start, stop) for col in columns},
+            copy=False
+        )
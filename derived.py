@@ -0,0 +1,110 @@
+import ast
+import json
+import re
+
+import numpy as np
+
+FUNCTIONS = {
+    'abs': np.abs,
+    'sqrt': np.sqrt,
+    'log': np.log,
+    'exp': np.exp,
+    'minimum': np.minimum,
+    'maximum': np.maximum
+}
+BINARY_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+    ast.Pow: np.power
+}
+UNARY_OPERATORS = {
+    ast.USub: np.negative,
+    ast.UAdd: np.positive
+}
+
+
+def compile_expression(expression):
+    """Compile an expression such as `Para1 - Para1Tgt` into (fn, columns).
+
+    fn(arrays) evaluates it over a dict of column arrays with one numpy ufunc
+    per operation; columns lists the column names it reads. Names that are
+    not Python identifiers go in backticks, e.g. `Film-Thickness` / Etch1.
+    Only arithmetic, numbers, column names and FUNCTIONS are accepted.
+    """
+    aliases = {}
+
+    def alias(match):
+        return aliases.setdefault(match.group(1), f'_column{len(aliases)}')
+
+    tree = ast.parse(re.sub(r'`([^`]+)`', alias, expression), mode='eval')
+    names = {placeholder: name for name, placeholder in aliases.items()}
+    columns = []
+
+    def build(node):
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            op, left, right = BINARY_OPERATORS[type(node.op)], build(node.left), build(node.right)
+            return lambda arrays: op(left(arrays), right(arrays))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            op, operand = UNARY_OPERATORS[type(node.op)], build(node.operand)
+            return lambda arrays: op(operand(arrays))
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            value = float(node.value)
+            return lambda arrays: value
+        if isinstance(node, ast.Name):
+            name = names.get(node.id, node.id)
+            if name not in columns:
+                columns.append(name)
+            return lambda arrays: arrays[name]
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS
+                and not node.keywords):
+            fn, args = FUNCTIONS[node.func.id], [build(arg) for arg in node.args]
+            return lambda arrays: fn(*(arg(arrays) for arg in args))
+        raise ValueError(f"Unsupported '{ast.unparse(node)}' in derived metric expression '{expression}'")
+
+    return build(tree.body), columns
+
+
+class DerivedMetrics:
+    """Parameters computed from other columns, declared as {name: expression}.
+
+    Expressions are compiled once; compute() evaluates all of them over a
+    block of rows at a time, in declaration order, so a metric may use the
+    ones declared before it. Results are float arrays with inf (a ratio over
+    zero) turned into NaN.
+    """
+
+    def __init__(self, expressions):
+        self.expressions = dict(expressions)
+        self._compiled = {name: compile_expression(expression) for name, expression in self.expressions.items()}
+
+    @classmethod
+    def load(cls, path):
+        """From a JSON file {"metrics": {name: expression}}"""
+        with open(path) as f:
+            config = json.load(f)
+        return cls(config['metrics'])
+
+    @property
+    def names(self):
+        return list(self._compiled)
+
+    def required_columns(self):
+        """Input columns the expressions read, other than derived metrics themselves"""
+        required = []
+        for name, (_, columns) in self._compiled.items():
+            required.extend(col for col in columns if col not in required and col not in self._compiled)
+        return required
+
+    def compute(self, arrays):
+        """{name: values} for every metric, from equal-length input column arrays"""
+        n_rows = len(next(iter(arrays.values())))
+        work = {col: np.asarray(arrays[col], dtype=float) for col in self.required_columns()}
+        derived = {}
+        with np.errstate(all='ignore'):
+            for name, (fn, _) in self._compiled.items():
+                values = np.array(np.broadcast_to(fn(work), n_rows), dtype=float)
+                values[np.isinf(values)] = np.nan
+                work[name] = derived[name] = values
+        return derived
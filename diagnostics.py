@@ -0,0 +1,239 @@
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+from flask import Blueprint, request, jsonify
+
+# Not walked into: code, classes and threads are shared with everything else
+OPAQUE_TYPES = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+                type, threading.Thread)
+
+
+def _array_owner(array):
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def deep_sizeof(obj, seen=None):
+    """Bytes held by obj and everything it references, each object counted once per `seen` set.
+
+    numpy views are charged to the array that owns the buffer, so a
+    DataFrame built on a store's columns costs nothing extra when both are
+    measured with the same `seen`.
+    """
+    seen = set() if seen is None else seen
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if isinstance(item, np.ndarray):
+            item = _array_owner(item)
+        if id(item) in seen or isinstance(item, OPAQUE_TYPES):
+            continue
+        seen.add(id(item))
+
+        if isinstance(item, np.ndarray):
+            total += sys.getsizeof(item) if item.base is None else item.nbytes
+            if item.dtype == object:
+                stack.extend(item.ravel())
+            continue
+        if isinstance(item, (pd.DataFrame, pd.Series)):
+            # pandas' own __sizeof__ counts the column buffers, which are walked below
+            total += object.__sizeof__(item) + item.index.memory_usage(deep=True)
+            frame = item.to_frame() if isinstance(item, pd.Series) else item
+            stack.extend(frame[col].to_numpy() for col in frame)
+            continue
+
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        else:
+            if hasattr(item, '__dict__'):
+                stack.append(item.__dict__)
+            for slot in getattr(type(item), '__slots__', ()):
+                if hasattr(item, slot):
+                    stack.append(getattr(item, slot))
+    return total
+
+
+def memory_report(structures):
+    """Bytes per named structure measured on its own, plus the total with shared buffers counted once.
+
+    structures maps a name to a callable returning the object, so anything
+    costly to reach (a freshly built layout) is only built when asked for.
+    """
+    sizes = {}
+    shared = set()
+    total = 0
+    for name, get in structures.items():
+        obj = get()
+        sizes[name] = deep_sizeof(obj)
+        total += deep_sizeof(obj, shared)
+    return {'structures': sizes, 'total_unique': total}
+
+
+def _top_stats(stats, limit):
+    return [
+        {
+            'where': str(stat.traceback),
+            'size': stat.size,
+            'count': stat.count,
+            **({'size_diff': stat.size_diff, 'count_diff': stat.count_diff} if hasattr(stat, 'size_diff') else {})
+        }
+        for stat in stats[:limit]
+    ]
+
+
+class SnapshotLog:
+    """The last few tracemalloc snapshots, numbered in the order they were taken"""
+
+    def __init__(self, size=8):
+        self.size = size
+        self._snapshots = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def take(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>')
+        ])
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = (time.time(), snapshot)
+            while len(self._snapshots) > self.size:
+                self._snapshots.popitem(last=False)
+        return snapshot_id, snapshot
+
+    def get(self, snapshot_id):
+        with self._lock:
+            return self._snapshots.get(snapshot_id, (None, None))[1]
+
+    def list(self):
+        with self._lock:
+            return [{'id': snapshot_id, 'time': taken} for snapshot_id, (taken, _) in self._snapshots.items()]
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+
+
+def create_diagnostics_blueprint(token, structures):
+    """Blueprint with the admin-only memory routes under /api/admin/memory.
+
+    Every request needs the header X-Admin-Token: <token>.
+
+    GET  /api/admin/memory                     bytes per structure, tracemalloc status
+    POST /api/admin/memory/tracemalloc/start   start tracing (?frames=N, default 1)
+    POST /api/admin/memory/tracemalloc/stop    stop tracing, dropping its snapshots
+    POST /api/admin/memory/snapshot            take a snapshot, top allocation sites
+    GET  /api/admin/memory/diff?from=1&to=2    growth between snapshots; to defaults to now
+
+    tracemalloc stays off until started here, and the blueprint is only
+    registered when a token is configured, so neither costs anything unused.
+
+    Tracing and snapshots belong to the worker process that served the
+    request, whose pid the status and snapshot responses carry. Under several
+    gunicorn workers consecutive requests usually reach different processes,
+    so run a single worker (gunicorn -w 1) while profiling with these routes.
+    """
+    blueprint = Blueprint('diagnostics', __name__)
+    snapshots = SnapshotLog()
+
+    def _int_arg(name, default, minimum=1):
+        value = request.args.get(name, default)
+        if value is None:
+            raise ValueError(f"{name} is required")
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValueError(f"{name} must be an integer, got '{value}'")
+        if value < minimum:
+            raise ValueError(f"{name} must be at least {minimum}")
+        return value
+
+    def _limit():
+        return _int_arg('limit', '20')
+
+    def _key_type():
+        key_type = request.args.get('key', 'lineno')
+        if key_type not in ('lineno', 'filename', 'traceback'):
+            raise ValueError("key must be lineno, filename or traceback")
+        return key_type
+
+    @blueprint.before_request
+    def check_token():
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+            return jsonify({'error': 'Admin token required'}), 403
+
+    @blueprint.route('/api/admin/memory', methods=['GET'])
+    def memory():
+        report = memory_report(structures)
+        report['tracemalloc'] = {
+            'pid': os.getpid(),
+            'tracing': tracemalloc.is_tracing(),
+            'snapshots': snapshots.list(),
+            **(dict(zip(('current', 'peak'), tracemalloc.get_traced_memory())) if tracemalloc.is_tracing() else {})
+        }
+        return jsonify(report)
+
+    @blueprint.route('/api/admin/memory/tracemalloc/start', methods=['POST'])
+    def start_tracing():
+        try:
+            frames = _int_arg('frames', '1')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return jsonify({'tracing': True, 'frames': tracemalloc.get_traceback_limit()})
+
+    @blueprint.route('/api/admin/memory/tracemalloc/stop', methods=['POST'])
+    def stop_tracing():
+        tracemalloc.stop()
+        snapshots.clear()
+        return jsonify({'tracing': False})
+
+    @blueprint.route('/api/admin/memory/snapshot', methods=['POST'])
+    def snapshot():
+        if not tracemalloc.is_tracing():
+            return jsonify({'error': 'tracemalloc is not running, POST .../tracemalloc/start first'}), 409
+        try:
+            key_type = _key_type()
+            limit = _limit()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        snapshot_id, taken = snapshots.take()
+        return jsonify({'id': snapshot_id, 'pid': os.getpid(), 'top': _top_stats(taken.statistics(key_type), limit)})
+
+    @blueprint.route('/api/admin/memory/diff', methods=['GET'])
+    def diff():
+        try:
+            key_type = _key_type()
+            limit = _limit()
+            first = snapshots.get(_int_arg('from', None))
+            second = snapshots.get(_int_arg('to', None)) if request.args.get('to') else None
+        except ValueError as e:
+            return jsonify({'error': f"Bad diff request: {e}"}), 400
+        if first is None:
+            return jsonify({'error': "Unknown snapshot in from, snapshots are kept per worker process"}), 404
+        if second is None:
+            if request.args.get('to'):
+                return jsonify({'error': "Unknown snapshot in to, snapshots are kept per worker process"}), 404
+            if not tracemalloc.is_tracing():
+                return jsonify({'error': 'tracemalloc is not running'}), 409
+            _, second = snapshots.take()
+        return jsonify({'top': _top_stats(second.compare_to(first, key_type), limit)})
+
+    return blueprint
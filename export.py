@@ -0,0 +1,226 @@
+import io
+import logging
+
+import numpy as np
+import pandas as pd
+from flask import Blueprint, Response, request, stream_with_context, jsonify
+
+from column_store import to_epoch_seconds
+from spc_stats import RULES, RULE_LOOKBACK, rule_violations
+
+logger = logging.getLogger(__name__)
+
+RECORD_COLUMNS = ['Batch', 'Parameter', 'Value', 'UCL', 'LCL', 'USL', 'LSL', 'Rules']
+
+
+def iter_violation_frames(store, params, limits, first_batch=None, last_batch=None, chunk_rows=65536):
+    """Yield DataFrames of per-batch rule violations, one chunk of history at a time.
+
+    Only rows committed when the generator starts are read, and each chunk is
+    evaluated with RULE_LOOKBACK rows of context so runs spanning chunks are
+    still caught. Memory stays bounded by chunk_rows regardless of history length.
+    The batch range is found with the store's Batch index, so only the chunks
+    holding it are read.
+    """
+    first_row, stop_row = 0, len(store)
+    selected = None
+    rows = store.rows_between('Batch', first_batch, last_batch)
+    if isinstance(rows, slice):
+        first_row, stop_row = rows.start, min(rows.stop, stop_row)
+    else:
+        # Batches were ingested out of order, so the range is a set of rows
+        selected = np.zeros(stop_row, dtype=bool)
+        selected[rows[rows < stop_row]] = True
+
+    for start in range(first_row, stop_row, chunk_rows):
+        stop = min(start + chunk_rows, stop_row)
+        batches = store.column('Batch', start, stop)
+        in_range = np.ones(len(batches), dtype=bool) if selected is None else selected[start:stop]
+        if not in_range.any():
+            continue
+
+        context_start = max(0, start - RULE_LOOKBACK)
+        offset = start - context_start
+        frames = []
+        for param in params:
+            flags = rule_violations(store.column(param, context_start, stop), limits[param])
+            flags = {rule: mask[offset:] & in_range for rule, mask in flags.items()}
+            rows = np.flatnonzero(np.logical_or.reduce(list(flags.values())))
+            if not len(rows):
+                continue
+
+            rule_names = np.full(len(rows), '', dtype=object)
+            for rule in RULES:
+                rule_names = np.where(flags[rule][rows], rule_names + rule + ';', rule_names)
+
+            frames.append(pd.DataFrame({
+                'Row': rows + start,
+                'Batch': batches[rows],
+                'Parameter': param,
+                'Value': store.column(param, start, stop)[rows],
+                'UCL': limits[param]['ucl'],
+                'LCL': limits[param]['lcl'],
+                'USL': limits[param]['usl'],
+                'LSL': limits[param]['lsl'],
+                'Rules': [names.rstrip(';') for names in rule_names]
+            }))
+
+        if frames:
+            yield pd.concat(frames).sort_values('Row', kind='stable')[RECORD_COLUMNS]
+
+
+def iter_history_frames(store, columns, rows, chunk_rows=65536):
+    """DataFrames of the given columns over rows (a slice or row numbers), chunk_rows at a time"""
+    if isinstance(rows, slice):
+        for start in range(rows.start, rows.stop, chunk_rows):
+            yield store.frame(start, min(start + chunk_rows, rows.stop), columns)
+        return
+    for start in range(0, len(rows), chunk_rows):
+        take = rows[start:start + chunk_rows]
+        yield pd.DataFrame({col: store.column(col)[take] for col in columns})
+
+
+def iter_csv(frames):
+    yield ','.join(RECORD_COLUMNS) + '\n'
+    for frame in frames:
+        yield frame.to_csv(index=False, header=False)
+
+
+class _ByteSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def iter_parquet(frames):
+    """One parquet row group per frame, streamed as it is written"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('Batch', pa.int64()),
+        ('Parameter', pa.string()),
+        ('Value', pa.float64()),
+        ('UCL', pa.float64()),
+        ('LCL', pa.float64()),
+        ('USL', pa.float64()),
+        ('LSL', pa.float64()),
+        ('Rules', pa.string())
+    ])
+    sink = _ByteSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for frame in frames:
+        writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _batch_arg(name):
+    value = request.args.get(name, '')
+    return float(value) if value else None
+
+
+def _time_arg(name):
+    value = request.args.get(name, '')
+    return float(to_epoch_seconds([value])[0]) if value else None
+
+
+def create_export_blueprint(store, params, get_limits, time_column=None):
+    """Blueprint with GET /api/export/violations and GET /api/export/history.
+
+    Violations take the query arguments params (comma separated, default all),
+    from / to (batch ids, inclusive) and format (csv or parquet).
+    get_limits(params) returns the current limits and centre line per
+    parameter.
+
+    History returns the raw rows of a batch range as CSV, or with by=time a
+    range of time_column, where from / to are ISO 8601 timestamps and
+    last=8h asks for the most recent span. Both are answered from the
+    store's sorted indexes without scanning the history.
+    """
+    blueprint = Blueprint('export', __name__)
+
+    @blueprint.route('/api/export/history', methods=['GET'])
+    def export_history():
+        selected = [p for p in request.args.get('params', '').split(',') if p] or list(params)
+        unknown = [p for p in selected if p not in params]
+        if unknown:
+            return jsonify({'error': f"Unknown parameters: {unknown}"}), 400
+
+        by = request.args.get('by', 'batch').lower()
+        try:
+            if by == 'batch':
+                column, (low, high) = 'Batch', (_batch_arg(name) for name in ('from', 'to'))
+            elif by == 'time' and time_column:
+                column, (low, high) = time_column, (_time_arg(name) for name in ('from', 'to'))
+                bounds = store.indexes[time_column].bounds()
+                if request.args.get('last') and bounds:
+                    low, high = bounds[1] - pd.Timedelta(request.args['last']).total_seconds(), None
+            else:
+                return jsonify({'error': "by must be batch" + (" or time" if time_column else "")}), 400
+        except ValueError:
+            return jsonify({'error': "from, to and last must be batch numbers, timestamps or durations"}), 400
+
+        columns = ['Batch', *([time_column] if time_column else []), *selected]
+        rows = store.rows_between(column, low, high)
+
+        def body():
+            yield ','.join(columns) + '\n'
+            for frame in iter_history_frames(store, columns, rows):
+                if time_column:
+                    frame[time_column] = pd.to_datetime(frame[time_column], unit='s', utc=True)
+                yield frame.to_csv(index=False, header=False)
+
+        response = Response(stream_with_context(body()), mimetype='text/csv')
+        response.headers['Content-Disposition'] = 'attachment; filename=spc_history.csv'
+        return response
+
+    @blueprint.route('/api/export/violations', methods=['GET'])
+    def export_violations():
+        selected = [p for p in request.args.get('params', '').split(',') if p] or list(params)
+        unknown = [p for p in selected if p not in params]
+        if unknown:
+            return jsonify({'error': f"Unknown parameters: {unknown}"}), 400
+        try:
+            first_batch, last_batch = (_batch_arg(name) for name in ('from', 'to'))
+        except ValueError:
+            return jsonify({'error': "from and to must be batch numbers"}), 400
+
+        export_format = request.args.get('format', 'csv').lower()
+        frames = iter_violation_frames(store, selected, get_limits(selected), first_batch, last_batch)
+        if export_format == 'csv':
+            body, mimetype = iter_csv(frames), 'text/csv'
+        elif export_format == 'parquet':
+            if not parquet_available():
+                return jsonify({'error': "Parquet export needs pyarrow installed"}), 501
+            body, mimetype = iter_parquet(frames), 'application/vnd.apache.parquet'
+        else:
+            return jsonify({'error': f"Unsupported format '{export_format}', use csv or parquet"}), 400
+
+        logger.info(f"Exporting violations for {len(selected)} parameters as {export_format}")
+        response = Response(stream_with_context(body), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename=spc_violations.{export_format}'
+        return response
+
+    return blueprint
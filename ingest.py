@@ -0,0 +1,147 @@
+import io
+import json
+import threading
+import logging
+
+import numpy as np
+import pandas as pd
+from flask import Blueprint, request, jsonify
+
+from column_store import to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class IngestError(ValueError):
+    """Rejected ingestion request, carrying the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _read_json(body):
+    payload = json.loads(body)
+    if isinstance(payload, dict):
+        return pd.DataFrame(payload)
+    if isinstance(payload, list) and all(isinstance(row, dict) for row in payload):
+        return pd.DataFrame.from_records(payload)
+    raise ValueError("JSON must be a list of row objects or an object of column lists")
+
+
+CONTENT_TYPES = {
+    'text/csv': lambda body: pd.read_csv(io.BytesIO(body)),
+    'application/csv': lambda body: pd.read_csv(io.BytesIO(body)),
+    'application/json': _read_json,
+    'application/x-ndjson': lambda body: pd.read_json(io.BytesIO(body), lines=True),
+    'application/ndjson': lambda body: pd.read_json(io.BytesIO(body), lines=True),
+}
+
+
+def parse_batches(body, content_type, columns, key_column='Batch', time_columns=(), optional_columns=(),
+                  integer_columns=()):
+    """Parse a CSV, JSON or NDJSON body into one numeric array per expected column.
+
+    JSON may be a list of row objects or an object of column lists. Every column
+    in `columns` must be present, optional_columns may be, and nothing else;
+    key_column may not be empty.
+    time_columns take ISO 8601 timestamps or epoch seconds and are stored as
+    epoch seconds. integer_columns must hold whole numbers in every row, as
+    the store keeps them in an integer dtype.
+    """
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type not in CONTENT_TYPES:
+        raise IngestError(f"Unsupported content type '{content_type}', use text/csv, "
+                          "application/json or application/x-ndjson", status=415)
+    if not body.strip():
+        raise IngestError("No rows in request")
+    try:
+        frame = CONTENT_TYPES[content_type](body)
+    except (ValueError, TypeError) as e:
+        raise IngestError(f"Could not parse body: {e}")
+    if not len(frame):
+        raise IngestError("No rows in request")
+
+    missing = [col for col in columns if col not in frame]
+    unexpected = [col for col in frame if col not in columns and col not in optional_columns]
+    if missing or unexpected:
+        raise IngestError(f"Column mismatch, missing: {missing}, unexpected: {unexpected}")
+
+    arrays = {}
+    for col in [*columns, *(col for col in optional_columns if col in frame)]:
+        if col in time_columns:
+            try:
+                arrays[col] = to_epoch_seconds(frame[col])
+            except (ValueError, TypeError):
+                raise IngestError(f"Column '{col}' has values that are not ISO 8601 timestamps")
+            continue
+        try:
+            arrays[col] = pd.to_numeric(frame[col], errors='raise').to_numpy(dtype=float)
+        except (ValueError, TypeError):
+            raise IngestError(f"Column '{col}' has non-numeric values")
+    if pd.isna(arrays[key_column]).any():
+        raise IngestError(f"Column '{key_column}' may not have empty values")
+    for col in integer_columns:
+        if col in arrays and not (np.isfinite(arrays[col]) & (arrays[col] == np.round(arrays[col]))).all():
+            raise IngestError(f"Column '{col}' must have a whole number in every row")
+    return arrays
+
+
+def read_body(max_bytes, read_size=65536):
+    """The request body, refused with 413 once it passes max_bytes rather than buffered whole"""
+    if request.content_length is not None and request.content_length > max_bytes:
+        raise IngestError(f"Body of {request.content_length} bytes exceeds the limit of {max_bytes}", status=413)
+    body = io.BytesIO()
+    while True:
+        chunk = request.stream.read(read_size)
+        if not chunk:
+            return body.getvalue()
+        body.write(chunk)
+        if body.tell() > max_bytes:
+            raise IngestError(f"Body exceeds the limit of {max_bytes} bytes", status=413)
+
+
+def create_ingest_blueprint(columns, commit, is_backlogged=None, max_in_flight=2, wait_timeout=5.0,
+                            max_rows=1_000_000, max_bytes=64 * 1024 * 1024, time_columns=(), optional_columns=(),
+                            integer_columns=()):
+    """Blueprint with POST /api/ingest.
+
+    commit(arrays) appends the parsed rows and updates the SPC state, returning a
+    JSON-able summary. At most max_in_flight requests are parsed and committed
+    at once; a request that cannot get a slot within wait_timeout seconds is
+    turned away with 503 and Retry-After so senders slow down instead of piling
+    up memory in the workers. While is_backlogged() is true, because evaluation
+    has fallen behind, requests are refused with 429 and Retry-After. Bodies
+    over max_bytes are refused with 413 before they are parsed. commit may
+    raise IngestError to refuse the rows, e.g. 409 for batches already held.
+    """
+    blueprint = Blueprint('ingest', __name__)
+    slots = threading.BoundedSemaphore(max_in_flight)
+
+    @blueprint.route('/api/ingest', methods=['POST'])
+    def ingest():
+        if is_backlogged is not None and is_backlogged():
+            response = jsonify({'error': 'Evaluation is behind ingestion, retry later'})
+            response.headers['Retry-After'] = '2'
+            return response, 429
+
+        if not slots.acquire(timeout=wait_timeout):
+            response = jsonify({'error': 'Ingestion is busy, retry later'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+
+        try:
+            arrays = parse_batches(read_body(max_bytes), request.content_type, columns,
+                                   time_columns=time_columns, optional_columns=optional_columns,
+                                   integer_columns=integer_columns)
+            n_rows = len(arrays[columns[0]])
+            if n_rows > max_rows:
+                raise IngestError(f"{n_rows} rows exceeds the limit of {max_rows} per request", status=413)
+            return jsonify(commit(arrays))
+        except IngestError as e:
+            logger.warning(f"Rejected ingestion request: {e}")
+            return jsonify({'error': str(e)}), e.status
+        finally:
+            slots.release()
+
+    return blueprint
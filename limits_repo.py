@@ -0,0 +1,174 @@
+import sqlite3
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+LIMIT_KEYS = ('usl', 'lsl', 'ucl', 'lcl')
+
+
+def select_latest(conn):
+    """{param: limits plus version} from the newest row per parameter"""
+    rows = conn.execute('''
+        SELECT param, usl, lsl, ucl, lcl, version FROM limit_versions
+        WHERE version IN (SELECT MAX(version) FROM limit_versions GROUP BY param)
+    ''').fetchall()
+    return {
+        row[0]: dict(zip(LIMIT_KEYS + ('version',), row[1:]))
+        for row in rows
+    }
+
+
+def read_latest_limits(path):
+    """Latest limits in the database at path, opened read-only: nothing is created, migrated or written"""
+    conn = sqlite3.connect(f'{Path(path).absolute().as_uri()}?mode=ro', uri=True, timeout=30)
+    try:
+        return select_latest(conn)
+    finally:
+        conn.close()
+
+
+class LimitsRepository:
+    """Versioned spec/control limits persisted in SQLite.
+
+    Every change is appended as a new row in limit_versions, so the latest row per
+    parameter is the current value and older rows are the history. Reads go
+    through an in-process cache that is refreshed from the database every
+    cache_ttl seconds, which is how edits made by other workers show up. Writes
+    land in the cache immediately and are flushed to the database in batches by
+    a background thread (write-behind).
+    """
+
+    def __init__(self, path, flush_interval=0.5, max_batch=100, cache_ttl=2.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.cache_ttl = cache_ttl
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._cache = {}
+        self._loaded_at = None
+        self._pending = []
+        self._inflight = []
+        self._wake = threading.Event()
+        self._stopped = False
+
+        self._init_db()
+        self._writer = threading.Thread(target=self._write_loop, name='limits-writer', daemon=True)
+        self._writer.start()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS limit_versions (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    param TEXT NOT NULL,
+                    usl REAL,
+                    lsl REAL,
+                    ucl REAL,
+                    lcl REAL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_limit_versions_param ON limit_versions (param, version)')
+
+    def _load_latest(self):
+        with self._connect() as conn:
+            return select_latest(conn)
+
+    def get_all(self):
+        """Latest limits for every parameter that has been stored"""
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded_at is None or now - self._loaded_at > self.cache_ttl:
+                latest = self._load_latest()
+                # Unflushed local edits are newer than anything in the database
+                for row in self._inflight + self._pending:
+                    latest[row['param']] = {key: row[key] for key in LIMIT_KEYS + ('version',)}
+                self._cache = latest
+                self._loaded_at = now
+            return {param: dict(limits) for param, limits in self._cache.items()}
+
+    def get(self, param):
+        return self.get_all().get(param)
+
+    def put(self, param, limits):
+        """Record a new version of param's limits; keys missing from limits keep their current value"""
+        # Refreshes the cache if due; the current row is read under the lock the write takes,
+        # so of two concurrent partial edits of one parameter the second builds on the first
+        self.get_all()
+        with self._lock:
+            current = self._cache.get(param) or {}
+            row = {key: current.get(key) for key in LIMIT_KEYS}
+            row.update({key: float(limits[key]) for key in LIMIT_KEYS if limits.get(key) is not None})
+            row.update(param=param, created_at=time.time(), version=None)
+            self._pending.append(row)
+            self._cache[param] = {key: row[key] for key in LIMIT_KEYS + ('version',)}
+            if len(self._pending) >= self.max_batch:
+                self._wake.set()
+
+    def history(self, param):
+        """All stored versions of param's limits, oldest first"""
+        self.flush()
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT version, usl, lsl, ucl, lcl, created_at FROM limit_versions '
+                'WHERE param = ? ORDER BY version',
+                (param,)
+            ).fetchall()
+        return [dict(zip(('version',) + LIMIT_KEYS + ('created_at',), row)) for row in rows]
+
+    def flush(self):
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._inflight = pending
+        if not pending:
+            return 0
+
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    'INSERT INTO limit_versions (param, usl, lsl, ucl, lcl, created_at) '
+                    'VALUES (:param, :usl, :lsl, :ucl, :lcl, :created_at)',
+                    pending
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Failed to flush {len(pending)} limit versions: {e}")
+            with self._lock:
+                self._pending = pending + self._pending
+                self._inflight = []
+            return 0
+        with self._lock:
+            self._inflight = []
+        return len(pending)
+
+    def _write_loop(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self._writer.join(timeout=5)
+        self.flush()
@@ -0,0 +1,431 @@
+"""Load test: concurrent virtual operators replaying dashboard traffic.
+
+Starts the app under gunicorn with a stub Azure OpenAI client (or targets
+--url), then runs --users virtual users for --duration seconds. Each user
+loads the page and fires the initial callbacks the browser would, then
+keeps clicking metric rows (update_param_row, update_control_chart and
+update_piechart), switching and editing limits on the Specification
+Settings tab and now and then asking the AI assistant. Like the browser,
+each user also holds the /api/stream SSE connection open while it works,
+which keeps one server thread busy per user. Reports p50/p95/p99 latency
+and requests/s per callback. For example:
+
+    python loadtest.py --users 50 --duration 60
+
+The local server runs with the Procfile's gunicorn workers, worker class
+and threads unless --workers, --worker-class or --threads say otherwise.
+Request bodies are built from /_dash-dependencies, so they follow the
+callbacks as the app changes. A locally started server gets its own copy of
+the limits database, so spec edits do not touch data/spc_limits.db.
+"""
+import argparse
+import json
+import os
+import random
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import requests
+
+# Callbacks replayed, recognised by the first output in their dependency
+CALLBACK_OUTPUTS = {
+    'update_param_row': '"metric_count"',
+    'update_control_chart': 'control-chart-live.figure',
+    'update_piechart': 'piechart.figure',
+    'update_value_setter_panel': 'value-setter-panel.children',
+    'update_value_setter_store': 'value-setter-store.data',
+    'update_what_if_graph': 'what-if-graph.figure',
+    'update_root_cause_ranking': 'root-cause-output.children',
+    'update_ai_response': 'ai-response-output.children',
+}
+
+# What a user does after loading the page, with relative weights
+ACTIONS = [('click metric', 60), ('select spec metric', 20), ('edit limits', 15), ('ask assistant', 5)]
+
+
+class StubCompletions:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def create(self, **kwargs):
+        time.sleep(self.latency)
+        message = SimpleNamespace(content="Stub answer: the control chart shows each batch against its limits.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class StubAzureOpenAI:
+    """Stands in for openai.AzureOpenAI, answering after a fixed delay without any network call"""
+
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=StubCompletions(float(os.getenv('LOADTEST_AI_LATENCY', '0.5'))))
+
+
+def stub_server():
+    """WSGI app for gunicorn ("loadtest:stub_server()"): the dashboard on the stub AI client"""
+    import openai
+
+    openai.AzureOpenAI = StubAzureOpenAI
+    os.environ.setdefault('AZURE_OPENAI_ENDPOINT', 'http://stub.invalid')
+    os.environ.setdefault('AZURE_OPENAI_DEPLOYMENT', 'stub')
+    import app
+    return app.server
+
+
+def procfile_settings(path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Procfile')):
+    """gunicorn workers, worker class and threads of the Procfile's web process, gunicorn's defaults where unset"""
+    settings = {'workers': 1, 'worker_class': 'sync', 'threads': 1}
+    options = {'-w': 'workers', '--workers': 'workers', '-k': 'worker_class', '--worker-class': 'worker_class',
+               '--threads': 'threads'}
+    if not os.path.exists(path):
+        return settings
+    with open(path) as f:
+        command = next((line.split(':', 1)[1] for line in f if line.startswith('web:')), '')
+    args = shlex.split(command)
+    for flag, value in zip(args, args[1:]):
+        if flag in options:
+            settings[options[flag]] = value if options[flag] == 'worker_class' else int(value)
+    return settings
+
+
+def start_server(port, workers, worker_class, threads, ai_latency, workdir):
+    db = os.getenv('SPC_LIMITS_DB', 'data/spc_limits.db')
+    if os.path.exists(db):
+        shutil.copy(db, os.path.join(workdir, 'spc_limits.db'))
+    env = dict(
+        os.environ,
+        SPC_LIMITS_DB=os.path.join(workdir, 'spc_limits.db'),
+        SPC_ALERT_LOG=os.path.join(workdir, 'spc_alerts.log'),
+        SPC_LOG_LEVEL=os.getenv('SPC_LOG_LEVEL', 'WARNING'),
+        LOADTEST_AI_LATENCY=str(ai_latency)
+    )
+    env.pop('SPC_ALERT_WEBHOOK', None)
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-k', worker_class, '--threads', str(threads),
+         '-b', f'127.0.0.1:{port}', 'loadtest:stub_server()'],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+
+
+def wait_ready(url, timeout=120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f'{url}/_dash-layout', timeout=5).ok:
+                return
+        except (requests.ConnectionError, requests.Timeout):
+            # Not listening yet, or its workers are still importing the app
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"server at {url} did not come up within {timeout:.0f} s")
+
+
+def _parse_id(text):
+    return json.loads(text) if text.startswith('{') else text
+
+
+def _split_output(output):
+    outputs = output[2:-2].split('...') if output.startswith('..') else [output]
+    return [(_parse_id(spec.rsplit('.', 1)[0]), spec.rsplit('.', 1)[1].split('@')[0]) for spec in outputs]
+
+
+def find_callbacks(dependencies):
+    """{callback name: dependency} for the callbacks in CALLBACK_OUTPUTS"""
+    found = {}
+    for dependency in dependencies:
+        if dependency['clientside_function'] is not None:
+            continue
+        first = dependency['output'].lstrip('.').split('...')[0]
+        for name, marker in CALLBACK_OUTPUTS.items():
+            if marker in first:
+                found.setdefault(name, dependency)
+    return found
+
+
+def layout_state(node, state):
+    """{'id.prop': value} for string ids and the metric_button ids mounted in a serialised layout"""
+    if isinstance(node, list):
+        for child in node:
+            layout_state(child, state)
+    elif isinstance(node, dict) and 'props' in node:
+        component_id = node['props'].get('id')
+        if isinstance(component_id, dict) and component_id.get('type') == 'metric_button':
+            state['buttons'].append(component_id)
+        for prop, value in node['props'].items():
+            if isinstance(component_id, str):
+                state[f'{component_id}.{prop}'] = value
+            layout_state(value, state)
+    return state
+
+
+class VirtualUser:
+    """One operator session: page load, then actions with think time until the deadline"""
+
+    def __init__(self, url, callbacks, recorder, think, seed, stream=True):
+        self.url = url
+        self.callbacks = callbacks
+        self.recorder = recorder
+        self.think = think
+        self.stream = stream
+        self.random = random.Random(seed)
+        self.session = requests.Session()
+        self.values = {}
+        self.buttons = []
+
+    def request(self, name, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.url + path, timeout=60, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        self.recorder.add(name, time.perf_counter() - start, ok)
+        return response
+
+    def _entry(self, spec, index):
+        component_id = _parse_id(spec['id'])
+        if isinstance(component_id, dict):
+            pattern = component_id['index']
+            if pattern == ['ALL']:
+                return [self._entry({**spec, 'id': json.dumps(button)}, button['index']) for button in self.buttons]
+            component_id = {**component_id, 'index': index}
+            key = f"{component_id['type']}.{spec['property']}"
+            value = component_id if spec['property'] == 'id' else self.values.get(key, 0)
+        else:
+            key = f"{component_id}.{spec['property']}"
+            value = self.values.get(key)
+        return {'id': component_id, 'property': spec['property'], 'value': value}
+
+    def fire(self, name, changed, index=None):
+        dependency = self.callbacks.get(name)
+        if dependency is None:
+            return None
+        outputs = [{'id': {**out_id, 'index': index} if isinstance(out_id, dict) else out_id, 'property': prop}
+                   for out_id, prop in _split_output(dependency['output'])]
+        body = {
+            'output': dependency['output'],
+            'outputs': outputs if dependency['output'].startswith('..') else outputs[0],
+            'inputs': [self._entry(spec, index) for spec in dependency['inputs']],
+            'state': [self._entry(spec, index) for spec in dependency['state']],
+            'changedPropIds': changed
+        }
+        return self.request(name, 'POST', '/_dash-update-component', json=body)
+
+    def load_page(self):
+        response = self.request('_dash-layout', 'GET', '/_dash-layout')
+        self.request('_dash-dependencies', 'GET', '/_dash-dependencies')
+        if response is None or not response.ok:
+            return False
+        state = layout_state(response.json(), {'buttons': []})
+        self.buttons = state.pop('buttons')
+        self.values = state
+        self.values['ai-question-input.value'] = "Why is this metric out of control?"
+
+        for name in ('update_control_chart', 'update_piechart', 'update_value_setter_panel',
+                     'update_what_if_graph', 'update_root_cause_ranking'):
+            self.fire(name, [])
+        for button in self.buttons:
+            self.fire('update_param_row', [], button['index'])
+        return True
+
+    def open_stream(self):
+        """Connect to /api/stream as spc_push.js does and read it on a thread; the response, or None if refused"""
+        start = time.perf_counter()
+        try:
+            response = requests.get(f'{self.url}/api/stream', stream=True, timeout=(10, 60))
+            ok = response.status_code == 200
+        except requests.RequestException:
+            response, ok = None, False
+        self.recorder.add('api/stream', time.perf_counter() - start, ok)
+        if not ok:
+            if response is not None:
+                response.close()
+            return None
+        threading.Thread(target=self._read_stream, args=(response,), daemon=True).start()
+        return response
+
+    def _read_stream(self, response):
+        try:
+            for line in response.iter_lines():
+                if line.startswith(b'event:'):
+                    self.recorder.count_event()
+        except Exception:
+            # Closed under the reader when the user's session ends
+            pass
+
+    def click_metric(self):
+        button = self.random.choice(self.buttons)
+        key = 'metric_button.n_clicks'
+        self.values[key] = self.values.get(key, 0) + 1
+        changed = [json.dumps(button, separators=(',', ':'), sort_keys=True) + '.n_clicks']
+        self.fire('update_param_row', changed, button['index'])
+        self.fire('update_control_chart', changed)
+        self.fire('update_piechart', changed)
+
+    def select_spec_metric(self):
+        options = self.values.get('metric-select-dropdown.options') or [{'value': b['index']} for b in self.buttons]
+        self.values['metric-select-dropdown.value'] = self.random.choice(options)['value']
+        changed = ['metric-select-dropdown.value']
+        for name in ('update_value_setter_panel', 'update_what_if_graph', 'update_root_cause_ranking'):
+            self.fire(name, changed)
+
+    def edit_limits(self):
+        metric = self.values.get('metric-select-dropdown.value')
+        limits = (self.values.get('value-setter-store.data') or {}).get(metric)
+        if not limits:
+            return
+        for key in ('usl', 'lsl', 'ucl', 'lcl'):
+            self.values[f'ud_{key}_input.value'] = limits[key]
+        self.values['value-setter-set-btn.n_clicks'] = self.values.get('value-setter-set-btn.n_clicks') or 0
+        self.values['value-setter-set-btn.n_clicks'] += 1
+        self.fire('update_value_setter_store', ['value-setter-set-btn.n_clicks'])
+        self.fire('update_what_if_graph', ['value-setter-store.data'])
+
+    def ask_assistant(self):
+        self.values['ai-submit-button.n_clicks'] = (self.values.get('ai-submit-button.n_clicks') or 0) + 1
+        self.fire('update_ai_response', ['ai-submit-button.n_clicks'])
+
+    def run(self, deadline):
+        actions = {
+            'click metric': self.click_metric,
+            'select spec metric': self.select_spec_metric,
+            'edit limits': self.edit_limits,
+            'ask assistant': self.ask_assistant
+        }
+        names, weights = zip(*ACTIONS)
+        while time.monotonic() < deadline:
+            if not self.load_page():
+                time.sleep(self.think)
+                continue
+            stream = self.open_stream() if self.stream else None
+            try:
+                while time.monotonic() < deadline:
+                    actions[self.random.choices(names, weights)[0]]()
+                    time.sleep(self.random.uniform(0, 2 * self.think))
+            finally:
+                if stream is not None:
+                    stream.close()
+            break
+
+
+class Recorder:
+    """Latencies and failures per request name, shared by every virtual user"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.stream_events = 0
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def count_event(self):
+        with self._lock:
+            self.stream_events += 1
+
+    def report(self, elapsed):
+        rows = []
+        for name, latencies in sorted(self.latencies.items()):
+            p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+            rows.append({
+                'request': name,
+                'count': len(latencies),
+                'errors': self.errors.get(name, 0),
+                'p50_ms': round(float(p50), 1),
+                'p95_ms': round(float(p95), 1),
+                'p99_ms': round(float(p99), 1),
+                'req_per_s': round(len(latencies) / elapsed, 2)
+            })
+        return rows
+
+
+def print_report(rows, elapsed, users):
+    print(f"{users} users for {elapsed:.0f} s")
+    print(f"{'request':<28} {'count':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+    for row in rows:
+        print(f"{row['request']:<28} {row['count']:>7} {row['errors']:>7} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['req_per_s']:>8.2f}")
+    total = sum(row['count'] for row in rows)
+    print(f"{'total':<28} {total:>7} {sum(row['errors'] for row in rows):>7} "
+          f"{'':>8} {'':>8} {'':>8} {total / elapsed:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='running server to test; a local gunicorn server is started when omitted')
+    procfile = procfile_settings()
+    parser.add_argument('--workers', type=int, default=procfile['workers'],
+                        help='gunicorn workers for the local server, default from the Procfile')
+    parser.add_argument('--worker-class', default=procfile['worker_class'],
+                        help='gunicorn worker class, default from the Procfile')
+    parser.add_argument('--threads', type=int, default=procfile['threads'],
+                        help='gunicorn threads per worker, default from the Procfile')
+    parser.add_argument('--no-stream', action='store_true', help='do not hold an /api/stream connection per user')
+    parser.add_argument('--port', type=int, default=8051)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of load after the server is up')
+    parser.add_argument('--think', type=float, default=1.0, help='mean seconds a user waits between actions')
+    parser.add_argument('--ai-latency', type=float, default=0.5, help='seconds the stub AI client takes to answer')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the report rows to this file')
+    args = parser.parse_args(argv)
+
+    server = workdir = None
+    url = args.url
+    if not url:
+        workdir = tempfile.mkdtemp(prefix='spc-loadtest-')
+        server = start_server(args.port, args.workers, args.worker_class, args.threads, args.ai_latency, workdir)
+        url = f'http://127.0.0.1:{args.port}'
+    try:
+        wait_ready(url)
+        callbacks = find_callbacks(requests.get(f'{url}/_dash-dependencies', timeout=30).json())
+        missing = sorted(set(CALLBACK_OUTPUTS) - set(callbacks))
+        if missing:
+            print(f"not replayed, no such callback: {', '.join(missing)}", file=sys.stderr)
+
+        recorder = Recorder()
+        start = time.monotonic()
+        deadline = start + args.duration
+        users = [
+            threading.Thread(target=VirtualUser(url, callbacks, recorder, args.think, args.seed + i,
+                                                stream=not args.no_stream).run,
+                             args=(deadline,), daemon=True)
+            for i in range(args.users)
+        ]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.monotonic() - start
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                # Streams still being served hold up gunicorn's graceful shutdown (30 s by default)
+                server.wait(timeout=45)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    rows = recorder.report(elapsed)
+    print_report(rows, elapsed, args.users)
+    print(f"stream events received: {recorder.stream_events}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'users': args.users, 'seconds': round(elapsed, 1), 'requests': rows,
+                       'stream_events': recorder.stream_events}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
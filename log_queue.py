@@ -0,0 +1,150 @@
+import atexit
+import itertools
+import json
+import logging
+import queue
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+import numpy as np
+
+
+def cap_field(value, max_chars=512, max_items=20):
+    """A log field value bounded in size: long strings and sequences are cut with a note of their full size"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        capped = {
+            str(key): cap_field(item, max_chars, max_items)
+            for key, item in itertools.islice(value.items(), max_items)
+        }
+        if len(value) > max_items:
+            capped['...'] = f'{len(value)} keys'
+        return capped
+    if isinstance(value, (list, tuple, np.ndarray)):
+        head = value[:max_items]
+        capped = [cap_field(item, max_chars, max_items) for item in (head.tolist() if isinstance(head, np.ndarray) else head)]
+        if len(value) > max_items:
+            capped.append(f'... {len(value)} items')
+        return capped
+    text = str(value)
+    return text if len(text) <= max_chars else f'{text[:max_chars]}... ({len(text)} chars)'
+
+
+def parse_sample_rates(spec):
+    """'app=0.1,werkzeug=0.01' -> {'app': 0.1, 'werkzeug': 0.01}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, rate = item.partition('=')
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in round(1 / rate) records below always_level per logger.
+
+    Rates are looked up by logger name and then its dotted parents, so
+    'werkzeug' also samples 'werkzeug._internal'; a rate of 0 drops those
+    records and unlisted loggers keep everything. Warnings and errors are
+    never sampled out.
+    """
+
+    def __init__(self, rates, always_level=logging.WARNING):
+        super().__init__()
+        self.rates = dict(rates)
+        self.always_level = always_level
+        self._every = {}
+        self._counters = defaultdict(itertools.count)
+
+    def _keep_every(self, name):
+        parts = name.split('.')
+        for i in range(len(parts), 0, -1):
+            rate = self.rates.get('.'.join(parts[:i]))
+            if rate is not None:
+                return max(1, round(1 / rate)) if rate > 0 else 0
+        return 1
+
+    def filter(self, record):
+        if record.levelno >= self.always_level:
+            return True
+        every = self._every.get(record.name)
+        if every is None:
+            every = self._every[record.name] = self._keep_every(record.name)
+        if every <= 1:
+            return every == 1
+        return next(self._counters[record.name]) % every == 0
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the logging thread.
+
+    The message and the record's structured `fields` (passed as
+    extra={'fields': {...}}) are capped before queueing, so a record's size
+    does not follow the data it describes. When the queue is full the record
+    is dropped and counted, and the next record that gets through carries
+    the count.
+    """
+
+    def __init__(self, log_queue, max_field_chars=512, max_message_chars=2048):
+        super().__init__(log_queue)
+        self.max_field_chars = max_field_chars
+        self.max_message_chars = max_message_chars
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.msg = record.message = cap_field(record.msg, self.max_message_chars)
+        if getattr(record, 'fields', None):
+            record.fields = cap_field(record.fields, self.max_field_chars)
+        return record
+
+    def enqueue(self, record):
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.dropped = 0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and the record's fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **(getattr(record, 'fields', None) or {})
+        }
+        if getattr(record, 'dropped', 0):
+            entry['dropped_before'] = record.dropped
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level='INFO', sample_rates=None, max_field_chars=512, queue_size=10000, stream=None):
+    """Route every logger through a bounded queue to a JSON lines stream written by a background thread.
+
+    Callers only filter, cap and enqueue a record; formatting and writing to
+    the stream (stderr by default) happen on the listener thread.
+    """
+    log_queue = queue.Queue(queue_size)
+    handler = DroppingQueueHandler(log_queue, max_field_chars)
+    handler.addFilter(SamplingFilter(sample_rates or {}))
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    listener = QueueListener(log_queue, output)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,162 @@
+import glob
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from archive import DEFAULT_CHUNK_ROWS, HistoryArchive, iter_csv_chunks
+from limits_repo import LIMIT_KEYS
+from spc_stats import RuleCounter, historical_limits, is_limit_column, limit_overrides
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(path, block_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def evaluate_line(path, chunk_rows=DEFAULT_CHUNK_ROWS, saved_limits=None):
+    """Limits, OOC summary and rule violation counts per parameter of one line's history file.
+
+    The same computation the dashboard runs at startup: historical_limits over
+    the running stats, overlaid with any saved limits ({param: {'ucl': ...}}),
+    then the checks against those limits. Done in two chunked passes so a
+    worker's memory does not grow with the file. Runs in a worker process, so
+    it takes and returns plain data.
+    """
+    saved_limits = saved_limits or {}
+    archive, _ = HistoryArchive.load(path, tail_rows=0, chunk_rows=chunk_rows)
+    first_row = pd.read_csv(path, nrows=1).iloc[0]
+    params = [param for param in archive.params if not is_limit_column(param)]
+
+    limits = {}
+    for param in params:
+        stats = archive.stats[param]
+        limits[param] = historical_limits(stats.mean, stats.std, limit_overrides(first_row, param))
+        saved = saved_limits.get(param, {})
+        limits[param].update({key: saved[key] for key in LIMIT_KEYS if saved.get(key) is not None})
+
+    counters = {param: RuleCounter(limits[param]) for param in params}
+    for chunk in iter_csv_chunks(path, params, chunk_rows):
+        for param, counter in counters.items():
+            counter.update(chunk[param].to_numpy(dtype=float))
+
+    n_rows = archive.n_rows
+    return {
+        'line': os.path.splitext(os.path.basename(path))[0],
+        'path': path,
+        'rows': n_rows,
+        'params': {
+            param: {
+                **{key: float(value) for key, value in limits[param].items()},
+                'ooc_count': counters[param].counts['ooc'],
+                'ooc_rate': counters[param].counts['ooc'] / n_rows if n_rows else 0.0,
+                'violations': counters[param].counts
+            }
+            for param in params
+        }
+    }
+
+
+class PlantMonitor:
+    """Plant-wide SPC summary over a directory of per-line history files.
+
+    refresh() evaluates the line files in parallel on a process pool and keeps
+    each result with the file's mtime, size and content hash. A file is only
+    re-evaluated when its mtime or size moved and its content hash changed, so
+    a refresh after one line appended batches costs one line's evaluation.
+
+    The pool runs outside the lock, so other callers read the last results
+    meanwhile, and its workers are spawned rather than forked, as the
+    dashboard process has other threads that may hold locks at fork time.
+    When refreshes overlap, a result is kept only if no later scan stored one.
+    """
+
+    def __init__(self, directory, pattern='*.csv', max_workers=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.directory = directory
+        self.pattern = pattern
+        self.max_workers = max_workers
+        self.chunk_rows = chunk_rows
+        self._results = {}
+        self._scans = 0
+        self._lock = threading.Lock()
+
+    def paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, self.pattern)))
+
+    def refresh(self):
+        """Re-evaluate changed line files; returns the summary and the lines that were recomputed"""
+        with self._lock:
+            self._scans += 1
+            scan = self._scans
+            paths = self.paths()
+            changed = {}
+            for path in paths:
+                stat = os.stat(path)
+                cached = self._results.get(path)
+                if cached and cached['mtime'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+                    continue
+                digest = file_digest(path)
+                if cached and cached['digest'] == digest:
+                    cached.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+                    continue
+                changed[path] = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'digest': digest, 'scan': scan}
+
+        results = {}
+        if changed:
+            workers = min(len(changed), self.max_workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {path: pool.submit(evaluate_line, path, self.chunk_rows) for path in changed}
+            for path, future in futures.items():
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to evaluate line file {path}: {e}")
+                    results[path] = None
+
+        with self._lock:
+            for path, summary in results.items():
+                if self._results.get(path, {}).get('scan', 0) > scan:
+                    continue
+                if summary is None:
+                    self._results.pop(path, None)
+                else:
+                    self._results[path] = {**changed[path], 'summary': summary}
+
+            for path in set(self._results) - set(paths):
+                if self._results[path]['scan'] <= scan:
+                    del self._results[path]
+
+            lines = [self._results[path]['summary'] for path in paths if path in self._results]
+            return merge_lines(lines), [changed_path for changed_path in changed if changed_path in self._results]
+
+
+def merge_lines(lines):
+    """Plant summary from per-line results: totals per parameter across lines, plus the lines"""
+    params = {}
+    for line in lines:
+        for param, summary in line['params'].items():
+            total = params.setdefault(param, {'rows': 0, 'ooc_count': 0, 'lines': 0})
+            total['rows'] += line['rows']
+            total['ooc_count'] += summary['ooc_count']
+            total['lines'] += 1
+    for total in params.values():
+        total['ooc_rate'] = total['ooc_count'] / total['rows'] if total['rows'] else 0.0
+
+    rows = sum(line['rows'] for line in lines)
+    ooc = sum(total['ooc_count'] for total in params.values())
+    checks = sum(total['rows'] for total in params.values())
+    return {
+        'lines': lines,
+        'params': params,
+        'rows': rows,
+        'ooc_rate': ooc / checks if checks else 0.0
+    }
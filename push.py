@@ -0,0 +1,162 @@
+import json
+import queue
+import threading
+import logging
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event, payload):
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+class PushChannel:
+    """Server-sent-event fan-out fed by a single producer thread.
+
+    notify(start, stop) marks history rows as new; the producer coalesces
+    pending ranges, calls build_deltas(start, stop) once to get a payload per
+    parameter, encodes each payload once and hands the same string to every
+    subscriber that asked for that parameter. Per-client work is a queue put
+    and a socket write. A subscriber whose queue is full (a stalled browser)
+    is sent a 'resync' event in place of the dropped ones and can reload.
+    The producer and alert sinks publish from different threads, so the
+    drain and the resync put are made under the subscriber's own lock.
+    """
+
+    def __init__(self, build_deltas, queue_size=256, keepalive=15.0):
+        self.build_deltas = build_deltas
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._pending = None
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='push-producer', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def notify(self, start, stop):
+        with self._lock:
+            if self._pending is None:
+                self._pending = (start, stop)
+            else:
+                self._pending = (min(self._pending[0], start), max(self._pending[1], stop))
+        self._wake.set()
+
+    def publish(self, event, payload, topic=None):
+        """Send one event to every subscriber of topic, or to all subscribers when topic is None"""
+        message = format_event(event, payload)
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for messages, (topics, lock) in subscribers:
+            if topic is None or topic in topics:
+                self._offer(messages, lock, message)
+
+    def _offer(self, messages, lock, message):
+        with lock:
+            try:
+                messages.put_nowait(message)
+                return
+            except queue.Full:
+                pass
+            # Drop the backlog; the client reloads state rather than replaying stale deltas
+            while True:
+                try:
+                    messages.get_nowait()
+                except queue.Empty:
+                    break
+            messages.put_nowait(format_event('resync', {}))
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                pending, self._pending = self._pending, None
+            if pending is None:
+                continue
+            try:
+                for topic, payload in self.build_deltas(*pending).items():
+                    self.publish('delta', payload, topic=topic)
+            except Exception as e:
+                logger.error(f"Failed to build push deltas: {e}")
+
+    def stream(self, topics):
+        """Generator of SSE text for one client, ends when the client disconnects"""
+        messages = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[messages] = (set(topics), threading.Lock())
+        try:
+            yield 'retry: 3000\n\n'
+            while not self._stopped:
+                try:
+                    yield messages.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+        finally:
+            with self._lock:
+                self._subscribers.pop(messages, None)
+
+
+def create_push_blueprint(channel, params, max_streams=None, poll=None):
+    """Blueprint with GET /api/stream?params=a,b (default all) serving the channel as SSE.
+
+    Each open stream keeps one server thread for as long as the browser is
+    connected. Past max_streams subscribers in this process new streams are
+    refused with 503 and Retry-After, so the threads left serve callbacks.
+    Given poll(since) -> (cursor, deltas), GET /api/stream/poll?since=N serves
+    the same deltas to refused browsers in short requests: since is the
+    cursor of the previous poll, and the first poll (no since) only returns
+    the current cursor.
+    """
+    blueprint = Blueprint('push', __name__)
+
+    @blueprint.route('/api/stream', methods=['GET'])
+    def stream():
+        if max_streams is not None and channel.subscriber_count() >= max_streams:
+            response = jsonify({'error': 'Too many live update streams, retry later'})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        topics = [p for p in request.args.get('params', '').split(',') if p in params] or list(params)
+        response = Response(stream_with_context(channel.stream(topics)), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    if poll is not None:
+        @blueprint.route('/api/stream/poll', methods=['GET'])
+        def poll_deltas():
+            try:
+                since = int(request.args['since']) if request.args.get('since') else None
+            except ValueError:
+                return jsonify({'error': "since must be an integer"}), 400
+            cursor, deltas = poll(since)
+            return jsonify({'cursor': cursor, 'deltas': deltas})
+
+    return blueprint
+
+
+class PushSink:
+    """Alert sink that forwards alerts to every connected browser"""
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def send(self, alert):
+        self.channel.publish('alert', alert)
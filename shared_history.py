@@ -0,0 +1,120 @@
+import fcntl
+import hashlib
+import io
+import os
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Bytes before a mark that must still match for the rows before it to count as unchanged
+MARK_BYTES = 4096
+
+
+def file_mark(path):
+    """Where a growing CSV ends now: its size and a digest of the bytes just before that point"""
+    size = os.path.getsize(path)
+    return {'path': path, 'offset': size, 'digest': _digest(path, size)}
+
+
+def _digest(path, offset):
+    with open(path, 'rb') as f:
+        f.seek(max(offset - MARK_BYTES, 0))
+        return hashlib.sha1(f.read(min(offset, MARK_BYTES))).hexdigest()
+
+
+def mark_holds(mark):
+    """True while the file still starts with the bytes it had up to mark"""
+    return os.path.getsize(mark['path']) >= mark['offset'] and _digest(mark['path'], mark['offset']) == mark['digest']
+
+
+def read_appended(mark, columns):
+    """(rows written to the file after mark, mark after them), or (None, None) if the file was rewritten since.
+
+    A last line still being written (no newline yet) is left for the next read.
+    """
+    if not mark_holds(mark):
+        return None, None
+    path, offset = mark['path'], mark['offset']
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1]
+    end = offset + len(data)
+    new_mark = {'path': path, 'offset': end, 'digest': _digest(path, end)} if data else mark
+    if not data.strip():
+        return pd.DataFrame({col: [] for col in columns}), new_mark
+    return pd.read_csv(io.BytesIO(data), header=None, names=columns), new_mark
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive advisory lock on path, shared by every process on the host"""
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class LeaderLock:
+    """Non-blocking lock that one process takes and keeps for as long as it lives.
+
+    held() tries to take it on every call until it succeeds, so when the
+    holder exits (the kernel drops its lock) another process takes over.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def held(self):
+        with self._lock:
+            if self._file is None:
+                f = open(self.path, 'a')
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    f.close()
+                    return False
+                self._file = f
+            return True
+
+
+class SharedHistoryFile:
+    """A CSV history that every worker process appends to and follows.
+
+    append() writes whole rows while holding lock(), so writes of different
+    processes never interleave. follow() returns the complete rows written
+    since this process last looked, by itself or any other process, so
+    every worker folds the same rows in the same order.
+    """
+
+    def __init__(self, path, columns, mark):
+        self.path = path
+        self.columns = list(columns)
+        self.mark = mark
+
+    def lock(self):
+        return file_lock(f'{self.path}.lock')
+
+    def append(self, frame):
+        data = frame[self.columns].to_csv(header=False, index=False, lineterminator='\n').encode()
+        with open(self.path, 'a+b') as f:
+            # The file may not end with a newline, its last row must not run into the first new one
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    data = b'\n' + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def follow(self):
+        frame, mark = read_appended(self.mark, self.columns)
+        if frame is None:
+            raise ValueError(f"{self.path} was rewritten, restart to reload it")
+        self.mark = mark
+        return frame
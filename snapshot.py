@@ -0,0 +1,171 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from archive import DisplaySeries, HistoryArchive
+from column_store import ColumnStore
+from spc_stats import FixedHistogram, HotellingT2Chart, LaggedCorrelation, RunningCovariance, RunningStats
+
+# Bumped whenever the layout below changes; snapshots of another version are ignored
+SNAPSHOT_VERSION = 2
+
+
+class Snapshot:
+    """Numpy arrays plus a JSON header, saved together as one uncompressed .npz file.
+
+    The header (meta) holds scalars and the keys of the arrays that put()
+    stored, so nested state keeps its shape without pickling anything.
+    Saving writes a temporary file and renames it over the old snapshot, so a
+    reader sees either the old file or the new one.
+    """
+
+    def __init__(self, meta=None, arrays=None):
+        self.meta = meta if meta is not None else {'version': SNAPSHOT_VERSION, 'created': time.time()}
+        self.arrays = arrays if arrays is not None else {}
+
+    def put(self, array):
+        key = f'a{len(self.arrays)}'
+        self.arrays[key] = np.asarray(array)
+        return key
+
+    def get(self, key):
+        return self.arrays[key]
+
+    def save(self, path):
+        header = np.frombuffer(json.dumps(self.meta).encode(), dtype=np.uint8)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, meta=header, **self.arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """The snapshot at path, or None if there is none or it has another version"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data['meta'].tobytes())
+            if meta.get('version') != SNAPSHOT_VERSION:
+                return None
+            return cls(meta, {key: data[key] for key in data.files if key != 'meta'})
+
+
+def pack_stats(stats):
+    return [stats.n, stats.mean, stats.m2, stats.min, stats.max]
+
+
+def unpack_stats(values):
+    stats = RunningStats()
+    stats.n, stats.mean, stats.m2, stats.min, stats.max = values
+    return stats
+
+
+def pack_histogram(snapshot, histogram):
+    return {'edges': snapshot.put(histogram.edges), 'counts': snapshot.put(histogram.counts)}
+
+
+def unpack_histogram(snapshot, packed):
+    edges = snapshot.get(packed['edges'])
+    histogram = FixedHistogram(edges[0], edges[-1], len(edges) - 1)
+    histogram.edges = edges.copy()
+    histogram.counts = snapshot.get(packed['counts']).copy()
+    return histogram
+
+
+def pack_covariance(snapshot, cov):
+    return {'n': cov.n, 'mean': snapshot.put(cov.mean), 'comoment': snapshot.put(cov.comoment)}
+
+
+def unpack_covariance(snapshot, packed):
+    cov = RunningCovariance(0)
+    cov.n = packed['n']
+    cov.mean = snapshot.get(packed['mean']).copy()
+    cov.comoment = snapshot.get(packed['comoment']).copy()
+    return cov
+
+
+def pack_store(snapshot, store):
+    return {
+        'columns': store.columns,
+        'dtypes': {col: str(store.column(col).dtype) for col in store.columns},
+        'decimals': store.decimals,
+        'index_columns': list(store.indexes),
+        'arrays': {col: snapshot.put(store.column(col)) for col in store.columns}
+    }
+
+
+def unpack_store(snapshot, packed):
+    store = ColumnStore(packed['columns'], {col: np.dtype(dtype) for col, dtype in packed['dtypes'].items()},
+                        packed['decimals'], packed['index_columns'])
+    store.append({col: snapshot.get(key) for col, key in packed['arrays'].items()})
+    return store
+
+
+def pack_archive(snapshot, archive):
+    return {
+        'params': archive.params,
+        'path': archive.path,
+        'chunk_rows': archive.chunk_rows,
+        'x_column': archive.x_column,
+        'n_rows': archive.n_rows,
+        'x_max': archive.x_max,
+        'stats': {param: pack_stats(stats) for param, stats in archive.stats.items()},
+        'display': {
+            param: {'max_points': series.max_points, 'n_rows': series.n_rows,
+                    'x': snapshot.put(series.x), 'y': snapshot.put(series.y)}
+            for param, series in archive.display.items()
+        },
+        # OOC counts already taken by a rescan, so limits seen before do not rescan again
+        'ooc_counts': [[*key, count] for key, count in archive._ooc_counts.items()]
+    }
+
+
+def unpack_archive(snapshot, packed):
+    archive = HistoryArchive(packed['params'], packed['path'], packed['chunk_rows'], x_column=packed['x_column'])
+    archive.n_rows = packed['n_rows']
+    archive.x_max = packed['x_max']
+    archive.stats = {param: unpack_stats(values) for param, values in packed['stats'].items()}
+    for param, series in packed['display'].items():
+        display = archive.display[param] = DisplaySeries(series['max_points'])
+        display.n_rows = series['n_rows']
+        display.x = snapshot.get(series['x'])
+        display.y = snapshot.get(series['y'])
+    archive._ooc_counts = {(param, ucl, lcl): count for param, ucl, lcl, count in packed['ooc_counts']}
+    return archive
+
+
+def pack_correlation(snapshot, correlation):
+    return {
+        'columns': correlation.columns,
+        'max_lag': correlation.max_lag,
+        'cov': pack_covariance(snapshot, correlation.cov),
+        'lagged': [pack_covariance(snapshot, cov) for cov in correlation.lagged],
+        'tail': snapshot.put(correlation._tail)
+    }
+
+
+def unpack_correlation(snapshot, packed):
+    correlation = LaggedCorrelation(packed['columns'], packed['max_lag'])
+    correlation.cov = unpack_covariance(snapshot, packed['cov'])
+    correlation.lagged = [unpack_covariance(snapshot, cov) for cov in packed['lagged']]
+    correlation._tail = snapshot.get(packed['tail']).reshape(-1, len(correlation.columns))
+    return correlation
+
+
+def pack_t2_chart(snapshot, chart):
+    return {
+        'columns': chart.columns,
+        'cov': pack_covariance(snapshot, chart.cov),
+        'batch': snapshot.put(chart.batch),
+        't2': snapshot.put(chart.t2)
+    }
+
+
+def unpack_t2_chart(snapshot, packed):
+    chart = HotellingT2Chart(packed['columns'])
+    chart.cov = unpack_covariance(snapshot, packed['cov'])
+    chart._batch.extend(snapshot.get(packed['batch']))
+    chart._t2.extend(snapshot.get(packed['t2']))
+    return chart
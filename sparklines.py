@@ -0,0 +1,60 @@
+import base64
+
+import numpy as np
+
+from spc_stats import downsample_minmax
+
+SPARKLINE_COLOR = 'rgb(255,209,95)'
+
+
+def sparkline_figure(x, y, name):
+    """Plotly sparkline carrying every point, one dcc.Graph per metric row"""
+    return {
+        'data': [{
+            'x': x,
+            'y': y,
+            'mode': 'lines+markers',
+            'name': name,
+            'line': {'color': SPARKLINE_COLOR}
+        }],
+        'layout': {
+            'uirevision': True,
+            'margin': dict(l=0, r=0, t=4, b=4, pad=0),
+            'paper_bgcolor': 'rgb(45, 48, 56)',
+            'plot_bgcolor': 'rgb(45, 48, 56)',
+            'showgrid': False,
+            'showaxis': False,
+            'zeroline': False,
+            'showticklabels': False
+        }
+    }
+
+
+def sparkline_svg(y, width=200, height=40, max_points=200):
+    """Min/max downsampled polyline of a series as a standalone SVG document"""
+    y = np.asarray(y, dtype=float)
+    x, y = downsample_minmax(np.arange(len(y)), y, max_points)
+    finite = ~np.isnan(y)
+    x, y = x[finite], y[finite]
+
+    points = ''
+    if len(y):
+        lo, hi = y.min(), y.max()
+        span_x = max(x[-1] - x[0], 1)
+        span_y = (hi - lo) or 1.0
+        px = (x - x[0]) / span_x * width
+        # SVG y grows downwards, keep a pixel of margin for the stroke
+        py = height - 1 - (y - lo) / span_y * (height - 2)
+        points = ' '.join(f'{a:.1f},{b:.1f}' for a, b in zip(px, py))
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'preserveAspectRatio="none"><polyline fill="none" stroke="{SPARKLINE_COLOR}" '
+        f'stroke-width="1" vector-effect="non-scaling-stroke" points="{points}"/></svg>'
+    )
+
+
+def sparkline_svg_uri(y, **kwargs):
+    """SVG sparkline as a data URI, ready for an html.Img src"""
+    svg = sparkline_svg(y, **kwargs)
+    return 'data:image/svg+xml;base64,' + base64.b64encode(svg.encode()).decode()
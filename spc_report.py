@@ -0,0 +1,138 @@
+"""Headless SPC report over one or more line history files.
+
+Runs the dashboard's limit, OOC and rule checks without the web app, one
+file per worker process, and writes a JSON or CSV summary per line and
+parameter. For example:
+
+    python spc_report.py data/spc_data.csv lines/*.csv --out report.json
+    python spc_report.py lines/*.csv --format csv --limits-db data/spc_limits.db
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from archive import DEFAULT_CHUNK_ROWS
+from limits_repo import LIMIT_KEYS, read_latest_limits
+from plant import evaluate_line, merge_lines
+from spc_stats import RULES
+
+CSV_COLUMNS = ['line', 'param', 'rows', *LIMIT_KEYS, 'mean', 'std', 'ooc_count', 'ooc_pct',
+               *(f'{rule}_violations' for rule in RULES)]
+
+
+def evaluate_files(paths, workers, chunk_rows, saved_limits):
+    """evaluate_line per path, spread over up to `workers` processes, in path order.
+
+    Returns (lines, errors): a file that cannot be evaluated (empty, not an
+    SPC history) is left out of lines and listed in errors as {'path', 'error'}.
+    """
+    workers = min(workers, len(paths))
+    lines, errors = [], []
+
+    def collect(path, evaluate):
+        try:
+            lines.append(evaluate())
+        except Exception as e:
+            errors.append({'path': path, 'error': str(e)})
+
+    if workers <= 1:
+        for path in paths:
+            collect(path, lambda: evaluate_line(path, chunk_rows, saved_limits))
+        return lines, errors
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [(path, pool.submit(evaluate_line, path, chunk_rows, saved_limits)) for path in paths]
+        for path, future in futures:
+            collect(path, future.result)
+    return lines, errors
+
+
+def report_rows(lines):
+    for line in lines:
+        for param, summary in line['params'].items():
+            yield {
+                'line': line['line'],
+                'param': param,
+                'rows': line['rows'],
+                **{key: summary[key] for key in (*LIMIT_KEYS, 'mean', 'std', 'ooc_count')},
+                'ooc_pct': round(summary['ooc_rate'] * 100, 4),
+                **{f'{rule}_violations': summary['violations'][rule] for rule in RULES}
+            }
+
+
+def write_json(lines, out, stats):
+    plant = merge_lines(lines)
+    json.dump({
+        'lines': lines,
+        'plant': {key: plant[key] for key in ('rows', 'ooc_rate', 'params')},
+        'stats': stats
+    }, out, indent=2)
+    out.write('\n')
+
+
+def write_csv(lines, out, stats):
+    writer = csv.DictWriter(out, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    writer.writerows(report_rows(lines))
+
+
+WRITERS = {'json': write_json, 'csv': write_csv}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='line history CSV files, laid out like data/spc_data.csv')
+    parser.add_argument('--out', help='report file, standard output when omitted')
+    parser.add_argument('--format', choices=sorted(WRITERS), help='defaults to the --out extension, else json')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--limits-db', help='apply limits saved from the Specification Settings tab')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or (os.path.splitext(args.out)[1].lstrip('.') if args.out else 'json')
+    if fmt not in WRITERS:
+        parser.error(f"unknown report format '{fmt}', use --format")
+    missing = [path for path in args.paths if not os.path.isfile(path)]
+    if missing:
+        parser.error(f"no such file: {', '.join(missing)}")
+
+    saved_limits = {}
+    if args.limits_db:
+        try:
+            saved_limits = read_latest_limits(args.limits_db)
+        except sqlite3.Error as e:
+            parser.error(f"cannot read limits from {args.limits_db}: {e}")
+
+    start = time.perf_counter()
+    lines, errors = evaluate_files(args.paths, args.workers, args.chunk_rows, saved_limits)
+    seconds = time.perf_counter() - start
+    rows = sum(line['rows'] for line in lines)
+    stats = {
+        'files': len(lines),
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_s': round(rows / seconds) if seconds else None,
+        'workers': min(args.workers, len(args.paths)),
+        'errors': errors
+    }
+
+    if args.out:
+        with open(args.out, 'w', newline='') as out:
+            WRITERS[fmt](lines, out, stats)
+    else:
+        WRITERS[fmt](lines, sys.stdout, stats)
+
+    for error in errors:
+        print(f"Failed to evaluate line file {error['path']}: {error['error']}", file=sys.stderr)
+    rate = f"{stats['rows_per_s']:,} rows/s" if stats['rows_per_s'] is not None else "rate n/a"
+    print(f"{stats['files']} files, {rows} rows in {seconds:.2f} s "
+          f"({rate} on {stats['workers']} workers)", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,482 @@
+import numpy as np
+
+
+def chi2_upper_limit(dof, z=3.0):
+    """Approximate upper chi-square quantile (Wilson-Hilferty), z=3 matches a 3-sigma chart"""
+    if dof <= 0:
+        return 0.0
+    h = 2.0 / (9.0 * dof)
+    return float(dof * (1.0 - h + z * np.sqrt(h)) ** 3)
+
+
+def historical_limits(mean, std, overrides=None):
+    """Default limits from the history: control limits at 2 sigma, specification limits at 3 sigma.
+
+    overrides maps any of 'ucl', 'lcl', 'usl' and 'lsl' to a value taken from elsewhere.
+    """
+    limits = {
+        'usl': round(mean + 3 * std, 3),
+        'lsl': round(mean - 3 * std, 3),
+        'ucl': round(mean + 2 * std, 3),
+        'lcl': round(mean - 2 * std, 3)
+    }
+    limits.update(overrides or {})
+    limits.update({'mean': round(mean, 3), 'std': round(std, 3)})
+    return limits
+
+
+LIMIT_COLUMN_KEYS = ('usl', 'lsl', 'ucl', 'lcl')
+
+
+def limit_overrides(first_row, param):
+    """Limits a history fixes in <param>_UCL/_LCL/_USL/_LSL columns, read from its first row"""
+    return {
+        key: first_row[f'{param}_{key.upper()}']
+        for key in LIMIT_COLUMN_KEYS
+        if f'{param}_{key.upper()}' in first_row
+    }
+
+
+def is_limit_column(column):
+    return column.endswith(tuple(f'_{key.upper()}' for key in LIMIT_COLUMN_KEYS))
+
+
+def ooc_mask(values, ucl, lcl):
+    """True where a value is on or beyond a control limit"""
+    values = np.asarray(values, dtype=float)
+    return (values >= ucl) | (values <= lcl)
+
+
+def ooc_summary(values, ucl, lcl):
+    """OOC count and fraction of the whole series in one vectorised pass"""
+    mask = ooc_mask(values, ucl, lcl)
+    count = int(np.count_nonzero(mask))
+    return count, (count / len(mask) if len(mask) else 0.0)
+
+
+def limit_grid_rates(sorted_values, n, ucls, lcls, usl, lsl):
+    """OOC and false-alarm fraction of a series for every candidate (ucl, lcl) pair at once.
+
+    sorted_values holds the series' non-missing values in ascending order and
+    n the length of the whole series. A point is OOC on or beyond a control
+    limit, as in ooc_mask, and a false alarm when it is OOC yet still within
+    the specification limits. Each candidate costs a few binary searches, so
+    a whole grid is one broadcast pass. Candidates need ucl > lcl.
+    """
+    ucls, lcls = np.asarray(ucls, dtype=float), np.asarray(lcls, dtype=float)
+    if not n:
+        return np.zeros(len(ucls)), np.zeros(len(ucls))
+    above = len(sorted_values) - np.searchsorted(sorted_values, ucls, side='left')
+    below = np.searchsorted(sorted_values, lcls, side='right')
+    # OOC points within [lsl, usl]: those in [max(ucl, lsl), usl] and in [lsl, min(lcl, usl)]
+    above_in_spec = (np.searchsorted(sorted_values, usl, side='right')
+                     - np.searchsorted(sorted_values, np.maximum(ucls, lsl), side='left'))
+    below_in_spec = (np.searchsorted(sorted_values, np.minimum(lcls, usl), side='right')
+                     - np.searchsorted(sorted_values, lsl, side='left'))
+    false_alarms = np.clip(above_in_spec, 0, None) + np.clip(below_in_spec, 0, None)
+    return (above + below) / n, false_alarms / n
+
+
+# Run rules on top of the control-limit check: points on one side of the
+# centre line, and consecutive points steadily rising or falling
+RULE_RUN_LENGTH = 9
+RULE_TREND_LENGTH = 6
+# Rows of history needed before a chunk to evaluate the rules at its first row
+RULE_LOOKBACK = max(RULE_RUN_LENGTH, RULE_TREND_LENGTH) - 1
+RULES = ('ooc', 'spec', 'run', 'trend')
+
+
+def _run_lengths(labels):
+    """Length of the run of equal labels ending at each position"""
+    n = len(labels)
+    if not n:
+        return np.empty(0, dtype=np.int64)
+    change = np.empty(n, dtype=bool)
+    change[0] = True
+    change[1:] = labels[1:] != labels[:-1]
+    starts = np.flatnonzero(change)
+    run_start = starts[np.cumsum(change) - 1]
+    return np.arange(n) - run_start + 1
+
+
+def rule_violations(values, limits):
+    """Boolean mask per rule for a series.
+
+    limits needs ucl/lcl (control), usl/lsl (specification) and mean (centre
+    line). A series that continues an earlier one should be passed with
+    RULE_LOOKBACK rows of that history in front, so runs carry across.
+    """
+    values = np.asarray(values, dtype=float)
+    side = np.sign(values - limits['mean'])
+    step = np.sign(np.diff(values, prepend=np.nan))
+    return {
+        'ooc': ooc_mask(values, limits['ucl'], limits['lcl']),
+        'spec': (values > limits['usl']) | (values < limits['lsl']),
+        'run': (_run_lengths(side) >= RULE_RUN_LENGTH) & (side != 0),
+        'trend': (_run_lengths(step) >= RULE_TREND_LENGTH - 1) & (step != 0)
+    }
+
+
+class RuleCounter:
+    """Violation counts per rule over a series fed in consecutive blocks.
+
+    The last RULE_LOOKBACK values of each block are carried into the next, so
+    runs and trends that straddle a block boundary are counted as in one pass.
+    """
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.counts = dict.fromkeys(RULES, 0)
+        self._context = np.empty(0)
+
+    def update(self, values):
+        series = np.concatenate([self._context, np.asarray(values, dtype=float)])
+        offset = len(self._context)
+        for rule, mask in rule_violations(series, self.limits).items():
+            self.counts[rule] += int(np.count_nonzero(mask[offset:]))
+        self._context = series[-RULE_LOOKBACK:]
+
+
+class FixedHistogram:
+    """Counts of a series over fixed, equal-width bins, plus an underflow and an overflow bin.
+
+    The edges never move, so a block of new values costs one searchsorted and
+    bincount over the block, and any coarser view over a sub-range (after the
+    limits change, say) is derived from the count array alone.
+    """
+
+    def __init__(self, low, high, n_bins=240):
+        if not high > low:
+            high = low + 1.0
+        self.edges = np.linspace(low, high, n_bins + 1)
+        self.counts = np.zeros(n_bins + 2, dtype=np.int64)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values):
+            # Bin 0 is below the first edge, bin n_bins + 1 at or above the last
+            self.counts += np.bincount(np.searchsorted(self.edges, values, side='right'), minlength=len(self.counts))
+
+    def view(self, low, high, max_bins=40):
+        """(edges, counts, underflow, overflow) over the bins covering [low, high], merged to at most max_bins"""
+        n_bins = len(self.edges) - 1
+        width = self.edges[1] - self.edges[0]
+        inner = self.counts[1:-1]
+        first = int(np.clip(np.searchsorted(self.edges, low, side='right') - 1, 0, n_bins - 1))
+        last = int(np.clip(np.searchsorted(self.edges, high, side='left'), first + 1, n_bins))
+        factor = -(-(last - first) // max_bins)
+        n_merged = -(-(last - first) // factor)
+        last = first + n_merged * factor
+
+        # Merged bins may run past the last edge, those parts are empty (their values are in overflow)
+        taken = inner[first:min(last, n_bins)]
+        padded = np.zeros(n_merged * factor, dtype=inner.dtype)
+        padded[:len(taken)] = taken
+        underflow = int(self.counts[0] + inner[:first].sum())
+        overflow = int(self.counts[-1] + inner[min(last, n_bins):].sum())
+        edges = self.edges[first] + np.arange(n_merged + 1) * factor * width
+        return edges, padded.reshape(n_merged, factor).sum(axis=1), underflow, overflow
+
+
+def downsample_minmax(x, y, max_points=2000):
+    """Reduce a series to at most max_points, keeping the min and max of every bucket"""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return x, y
+
+    bucket = -(-n // (max_points // 2))
+    n_buckets = -(-n // bucket)
+    padded = np.full(n_buckets * bucket, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(n_buckets, bucket)
+    offsets = np.arange(n_buckets) * bucket
+    i_min = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    i_max = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    idx = np.unique(np.concatenate([i_min, i_max]))
+    idx = idx[idx < n]
+    return x[idx], y[idx]
+
+
+class GrowableArray:
+    """Append-only 1-D buffer with amortised O(1) appends"""
+
+    def __init__(self, dtype=float, capacity=1024):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype).ravel()
+        needed = self._size + len(values)
+        if needed > len(self._data):
+            grown = np.empty(max(needed, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:needed] = values
+        self._size = needed
+
+    def view(self):
+        return self._data[:self._size]
+
+    @property
+    def nbytes(self):
+        """Bytes allocated, including the spare capacity kept for appends"""
+        return self._data.nbytes
+
+
+class RunningStats:
+    """Count, mean, sum of squared deviations, min and max of a stream.
+
+    Blocks are folded in with Chan's parallel formula, so two instances built
+    over different slices of a series can be merged into the exact result for
+    the whole series. Missing values are skipped.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        other = RunningStats()
+        other.n = len(values)
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.mean += delta * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.variance))
+
+
+class RunningCovariance:
+    """Running mean vector and co-moment matrix.
+
+    Single rows are folded in with the Welford rank-one update
+    C_n = C_{n-1} + (n-1)/n * d d^T, blocks of rows with Chan's merge (which is the
+    same sum of rank-one updates). The inverse covariance is cached and only
+    recomputed when it is requested after the estimate has moved.
+    """
+
+    def __init__(self, n_features):
+        self.n = 0
+        self.mean = np.zeros(n_features)
+        self.comoment = np.zeros((n_features, n_features))
+        self._inverse = None
+
+    @property
+    def n_features(self):
+        return len(self.mean)
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float)
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.comoment += np.outer(delta, x - self.mean)
+        self._inverse = None
+
+    def update_batch(self, rows):
+        rows = np.asarray(rows, dtype=float)
+        m = len(rows)
+        if m == 0:
+            return
+        if m == 1:
+            self.update(rows[0])
+            return
+
+        batch_mean = rows.mean(axis=0)
+        centered = rows - batch_mean
+        n = self.n + m
+        delta = batch_mean - self.mean
+        self.comoment += centered.T @ centered + np.outer(delta, delta) * (self.n * m / n)
+        self.mean += delta * (m / n)
+        self.n = n
+        self._inverse = None
+
+    def covariance(self):
+        if self.n < 2:
+            return np.zeros_like(self.comoment)
+        return self.comoment / (self.n - 1)
+
+    def std(self):
+        return np.sqrt(np.clip(np.diag(self.covariance()), 0, None))
+
+    def correlation(self):
+        std = self.std()
+        scale = np.where(std > 0, std, np.inf)
+        return self.covariance() / np.outer(scale, scale)
+
+    def rank(self):
+        """Number of non-degenerate features, the degrees of freedom of T2"""
+        return int(np.count_nonzero(self.std() > 0))
+
+    def inverse(self):
+        """Pseudo-inverse of the covariance, refreshed lazily after updates.
+
+        Inverting the correlation matrix and rescaling keeps the condition number
+        sane when columns differ by several orders of magnitude; constant columns
+        drop out with a zero row and column.
+        """
+        if self._inverse is None:
+            std = self.std()
+            inv_std = np.divide(1.0, std, out=np.zeros_like(std), where=std > 0)
+            corr_inv = np.linalg.pinv(self.correlation(), hermitian=True)
+            self._inverse = corr_inv * np.outer(inv_std, inv_std)
+        return self._inverse
+
+    def t2(self, rows, chunk_size=65536):
+        """Hotelling T2 of each row against the current estimate, in bounded-memory chunks"""
+        rows = np.atleast_2d(np.asarray(rows, dtype=float))
+        inv = self.inverse()
+        out = np.empty(len(rows))
+        for start in range(0, len(rows), chunk_size):
+            d = rows[start:start + chunk_size] - self.mean
+            out[start:start + chunk_size] = np.einsum('ij,ij->i', d @ inv, d)
+        return out
+
+
+def _complete_rows(rows):
+    """Rows with a missing measurement are scored as NaN and kept out of the estimate"""
+    return ~np.isnan(rows).any(axis=1)
+
+
+class HotellingT2Chart:
+    """Multivariate T2 chart over a fixed set of columns.
+
+    The history passed to fit() is scored against its own estimate (phase I).
+    Rows appended afterwards are scored against the estimate as it stood before
+    they arrived and are then folded in, so each append costs O(rows * p^2)
+    plus at most one refresh of the cached inverse.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.cov = RunningCovariance(len(self.columns))
+        self._batch = GrowableArray(dtype=np.int64)
+        self._t2 = GrowableArray()
+
+    def fit(self, batch, rows):
+        rows = np.asarray(rows, dtype=float)
+        self.cov.update_batch(rows[_complete_rows(rows)])
+        self._batch.extend(batch)
+        self._t2.extend(self.cov.t2(rows))
+
+    def append(self, batch, rows):
+        rows = np.atleast_2d(np.asarray(rows, dtype=float))
+        if not len(rows):
+            return np.empty(0)
+        scores = self.cov.t2(rows)
+        complete = rows[_complete_rows(rows)]
+        if len(complete) == 1:
+            self.cov.update(complete[0])
+        else:
+            self.cov.update_batch(complete)
+        self._batch.extend(batch)
+        self._t2.extend(scores)
+        return scores
+
+    @property
+    def batch(self):
+        return self._batch.view()
+
+    @property
+    def t2(self):
+        return self._t2.view()
+
+    @property
+    def ucl(self):
+        return chi2_upper_limit(self.cov.rank())
+
+    def ooc_count(self):
+        return int(np.count_nonzero(self.t2 > self.ucl))
+
+
+class LaggedCorrelation:
+    """Correlation between parameters at lags 0..max_lag from incremental co-moments.
+
+    Lag 0 is a RunningCovariance over the parameters; lag k keeps one over the
+    stacked pair (x_t, x_{t-k}), fed from a tail of the last max_lag rows so
+    pairs spanning two appends are not lost. Derived matrices are cached until
+    the next update, so reads never touch the raw data.
+    """
+
+    def __init__(self, columns, max_lag=5):
+        self.columns = list(columns)
+        self.max_lag = max_lag
+        p = len(self.columns)
+        self.cov = RunningCovariance(p)
+        self.lagged = [RunningCovariance(2 * p) for _ in range(max_lag)]
+        self._tail = np.empty((0, p))
+        self._cache = {}
+
+    def update(self, rows):
+        rows = np.atleast_2d(np.asarray(rows, dtype=float))
+        if not len(rows):
+            return
+        self.cov.update_batch(rows[_complete_rows(rows)])
+
+        extended = np.vstack([self._tail, rows])
+        first_new = len(self._tail)
+        for lag, acc in enumerate(self.lagged, start=1):
+            start = max(first_new, lag)
+            if start >= len(extended):
+                continue
+            pairs = np.hstack([extended[start:], extended[start - lag:len(extended) - lag]])
+            acc.update_batch(pairs[_complete_rows(pairs)])
+
+        self._tail = extended[-self.max_lag:] if self.max_lag else extended[:0]
+        self._cache = {}
+
+    def correlation(self, lag=0):
+        """Matrix r[i, j] = corr(x_i at t, x_j at t - lag)"""
+        if lag not in self._cache:
+            if lag == 0:
+                self._cache[lag] = self.cov.correlation()
+            else:
+                p = len(self.columns)
+                self._cache[lag] = self.lagged[lag - 1].correlation()[:p, p:]
+        return self._cache[lag]
+
+    def rank_related(self, target):
+        """Other parameters ordered by their strongest correlation with target, leading or concurrent"""
+        j = self.columns.index(target)
+        # rows: lag 0..max_lag, columns: candidate parameter leading the target by that lag
+        by_lag = np.nan_to_num(np.array([self.correlation(lag)[j] for lag in range(self.max_lag + 1)]))
+        best_lag = np.argmax(np.abs(by_lag), axis=0)
+        best = by_lag[best_lag, np.arange(len(self.columns))]
+
+        ranking = [
+            {'param': col, 'lag': int(best_lag[i]), 'corr': float(best[i])}
+            for i, col in enumerate(self.columns) if i != j
+        ]
+        ranking.sort(key=lambda item: abs(item['corr']), reverse=True)
+        return ranking
@@ -0,0 +1,43 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from archive import HistoryArchive
+
+N_ROWS = 200_000
+N_PARAMS = 5
+TAIL_ROWS = 5_000
+CHUNK_ROWS = 10_000
+
+
+def write_history(path):
+    rng = np.random.default_rng(0)
+    for start in range(0, N_ROWS, 50_000):
+        frame = pd.DataFrame({'Batch': np.arange(start + 1, start + 50_001)})
+        for i in range(N_PARAMS):
+            frame[f'p{i}'] = np.round(rng.normal(10.0, 1.0, len(frame)), 4)
+        frame.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+def test_chunked_load_peak_memory_follows_tail_and_chunk_size(tmp_path):
+    path = tmp_path / 'history.csv'
+    write_history(path)
+
+    tracemalloc.start()
+    try:
+        archive, tail = HistoryArchive.load(str(path), TAIL_ROWS, CHUNK_ROWS)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    # The tail plus one chunk in flight as float64, a few times over for parsing and
+    # copies, plus a fixed allowance for the CSV reader and the display series
+    row_bytes = (N_PARAMS + 1) * 8
+    budget = 4 * (TAIL_ROWS + CHUNK_ROWS) * row_bytes + 2 * 2 ** 20
+    assert budget < N_ROWS * row_bytes, "budget must be below what loading every row would take"
+    assert peak <= budget, f"chunked load peaked at {peak} bytes, budget {budget}"
+
+    assert len(tail) == TAIL_ROWS
+    assert archive.n_rows == N_ROWS - TAIL_ROWS
+    assert tail['Batch'].iloc[0] == N_ROWS - TAIL_ROWS + 1